@@ -0,0 +1,80 @@
+"""geo alert lifecycle
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Every statement is idempotent: fresh databases already get these columns and
+# indexes from Base.metadata.create_all, older ones only have the base table.
+
+
+def upgrade():
+    op.execute("ALTER TABLE geo_alerts ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP WITH TIME ZONE")
+    op.execute("ALTER TABLE geo_alerts ADD COLUMN IF NOT EXISTS occurrences INTEGER")
+    op.execute("ALTER TABLE geo_alerts ADD COLUMN IF NOT EXISTS resolved_at TIMESTAMP WITH TIME ZONE")
+    op.execute("ALTER TABLE geo_alerts ADD COLUMN IF NOT EXISTS latitude DOUBLE PRECISION")
+    op.execute("ALTER TABLE geo_alerts ADD COLUMN IF NOT EXISTS longitude DOUBLE PRECISION")
+
+    op.execute("UPDATE geo_alerts SET last_seen_at = COALESCE(triggered_at, now()) WHERE last_seen_at IS NULL")
+    op.execute("UPDATE geo_alerts SET occurrences = 1 WHERE occurrences IS NULL")
+    op.execute("UPDATE geo_alerts SET resolved = false WHERE resolved IS NULL")
+
+    # Collapse duplicate open alerts into the newest one per (asset, type) so
+    # the partial unique index can be built; the others are resolved.
+    op.execute("""
+        WITH ranked AS (
+            SELECT id,
+                   row_number() OVER w AS rn,
+                   count(*) OVER (PARTITION BY asset_id, alert_type) AS total,
+                   sum(occurrences) OVER (PARTITION BY asset_id, alert_type) AS total_occurrences,
+                   max(last_seen_at) OVER (PARTITION BY asset_id, alert_type) AS latest_seen
+            FROM geo_alerts
+            WHERE resolved = false AND alert_type IS NOT NULL
+            WINDOW w AS (PARTITION BY asset_id, alert_type ORDER BY triggered_at DESC NULLS LAST, id DESC)
+        ),
+        kept AS (
+            UPDATE geo_alerts g
+            SET occurrences = r.total_occurrences, last_seen_at = r.latest_seen
+            FROM ranked r
+            WHERE g.id = r.id AND r.rn = 1 AND r.total > 1
+        )
+        UPDATE geo_alerts g
+        SET resolved = true, resolved_at = now()
+        FROM ranked r
+        WHERE g.id = r.id AND r.rn > 1
+    """)
+
+    op.execute("ALTER TABLE geo_alerts ALTER COLUMN last_seen_at SET DEFAULT now()")
+    op.execute("ALTER TABLE geo_alerts ALTER COLUMN occurrences SET DEFAULT 1")
+    op.execute("ALTER TABLE geo_alerts ALTER COLUMN occurrences SET NOT NULL")
+    op.execute("ALTER TABLE geo_alerts ALTER COLUMN resolved SET DEFAULT false")
+    op.execute("ALTER TABLE geo_alerts ALTER COLUMN resolved SET NOT NULL")
+
+    op.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_geo_alert_open
+        ON geo_alerts (asset_id, alert_type)
+        WHERE resolved = false
+    """)
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_geo_alert_asset_triggered
+        ON geo_alerts (asset_id, triggered_at DESC, id DESC)
+    """)
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_geo_alert_asset_triggered")
+    op.execute("DROP INDEX IF EXISTS uq_geo_alert_open")
+    op.execute("ALTER TABLE geo_alerts ALTER COLUMN resolved DROP NOT NULL")
+    op.execute("ALTER TABLE geo_alerts DROP COLUMN IF EXISTS longitude")
+    op.execute("ALTER TABLE geo_alerts DROP COLUMN IF EXISTS latitude")
+    op.execute("ALTER TABLE geo_alerts DROP COLUMN IF EXISTS resolved_at")
+    op.execute("ALTER TABLE geo_alerts DROP COLUMN IF EXISTS occurrences")
+    op.execute("ALTER TABLE geo_alerts DROP COLUMN IF EXISTS last_seen_at")
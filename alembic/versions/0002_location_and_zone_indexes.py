@@ -0,0 +1,47 @@
+"""location history and zone indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+from sqlalchemy import text
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("asset_locations", "idx_asset_locations_asset_ts", "(asset_id, timestamp DESC, id DESC)"),
+    ("asset_locations", "idx_asset_locations_location", "USING gist (location)"),
+    ("geo_zones", "idx_geo_zone_asset_id", "(asset_id)"),
+]
+
+# create_all leaves existing tables alone, so databases from before the
+# partitioning change have an unpartitioned asset_locations without these
+# indexes. They are built CONCURRENTLY so ingest keeps running; PostgreSQL
+# can't do that on a partitioned table, where create_all already made them.
+# Converting asset_locations to partitions is a manual step, see README.
+
+
+def upgrade():
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        for table, name, columns in INDEXES:
+            relkind = bind.execute(
+                text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}
+            ).scalar()
+            if relkind is None:
+                continue
+            concurrently = "CONCURRENTLY " if relkind == "r" else ""
+            op.execute(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} {columns}")
+
+
+def downgrade():
+    # idx_asset_locations_location predates this revision (GeoAlchemy's
+    # spatial index on the old table), so it is left in place.
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_geo_zone_asset_id")
+        op.execute("DROP INDEX IF EXISTS idx_asset_locations_asset_ts")
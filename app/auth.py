@@ -4,10 +4,12 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from async_database import get_async_db
 from app.models.users_model import User, Role
-from app.schemas.user_schema import TokenData
+from app.schemas.user_schema import TokenData, Principal
+from app.services.principal_cache import principal_cache
 
 SECRET_KEY = "Hashed"  
 ALGORITHM = "HS256"
@@ -29,7 +31,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -45,17 +47,26 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == token_data.username).first()
+    principal = principal_cache.get(token_data.username)
+    if principal is not None:
+        return principal
+
+    result = await db.execute(
+        select(User.id, User.username, User.role, User.disabled).where(User.username == token_data.username)
+    )
+    user = result.mappings().first()
     if not user:
         raise credentials_exception
-    return user
+    principal = Principal(**user)
+    principal_cache.set(principal)
+    return principal
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     if current_user.disabled:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-async def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_admin_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     if current_user.role != Role.admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,detail="Admin privileges required")
 
@@ -1,22 +1,33 @@
-from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.assets_model import Asset
 from app.schemas.assets_schema import AssetCreate, AssetUpdate
 
-def get_asset(db: Session, asset_id: int):
-    return db.query(Asset).filter(Asset.id == asset_id).first()
+async def get_asset(db: AsyncSession, asset_id: int):
+    return await db.get(Asset, asset_id)
 
-def get_assets(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Asset).offset(skip).limit(limit).all()
+async def get_asset_by_unique_id(db: AsyncSession, unique_id: str):
+    result = await db.execute(select(Asset).where(Asset.unique_id == unique_id))
+    return result.scalars().first()
 
-def create_asset(db: Session, asset_data: AssetCreate):
+async def get_assets(db: AsyncSession, after_id: Optional[int] = None, limit: int = 100):
+    # Seek on the primary key rather than OFFSET so every page costs the same.
+    query = select(Asset).order_by(Asset.id).limit(limit)
+    if after_id is not None:
+        query = query.where(Asset.id > after_id)
+    result = await db.execute(query)
+    return result.scalars().all()
+
+async def create_asset(db: AsyncSession, asset_data: AssetCreate):
     db_asset = Asset(**asset_data.dict())
     db.add(db_asset)
-    db.commit()
-    db.refresh(db_asset)
+    await db.commit()
+    await db.refresh(db_asset)
     return db_asset
 
-def update_asset(db: Session, asset_id: int, update_data: AssetUpdate):
-    db_asset = get_asset(db, asset_id)
+async def update_asset(db: AsyncSession, asset_id: int, update_data: AssetUpdate):
+    db_asset = await get_asset(db, asset_id)
     if not db_asset:
         return None
 
@@ -33,14 +44,38 @@ def update_asset(db: Session, asset_id: int, update_data: AssetUpdate):
     if update_data.user_id is not None:
         db_asset.user_id = update_data.user_id
 
-    db.commit()
-    db.refresh(db_asset)
+    await db.commit()
+    await db.refresh(db_asset)
 
     return db_asset
 
-def delete_asset(db: Session, asset_id: int):
-    asset = db.query(Asset).filter(Asset.id == asset_id).first()
-    if asset:
-        db.delete(asset)
-        db.commit()
-    return asset
\ No newline at end of file
+async def delete_asset(db: AsyncSession, asset_id: int):
+    # Core DELETE: the ORM path would lazy-load Asset.locations, which an
+    # AsyncSession cannot do implicitly.
+    result = await db.execute(delete(Asset).where(Asset.id == asset_id).returning(Asset.id))
+    deleted = result.scalar()
+    await db.commit()
+    return deleted
+
+async def get_missing_asset_ids(db: AsyncSession, asset_ids: Iterable[int]) -> List[int]:
+    wanted = set(asset_ids)
+    if not wanted:
+        return []
+    result = await db.execute(select(Asset.id).where(Asset.id.in_(wanted)))
+    found = set(result.scalars().all())
+    return sorted(wanted - found)
+
+async def get_asset_ids_by_type(db: AsyncSession, asset_types: Iterable[str], limit: int) -> Dict[str, List[int]]:
+    wanted = list(set(asset_types))
+    if not wanted:
+        return {}
+    result = await db.execute(
+        select(Asset.asset_type, Asset.id)
+        .where(Asset.asset_type.in_(wanted))
+        .order_by(Asset.id)
+        .limit(limit)
+    )
+    groups = {asset_type: [] for asset_type in wanted}
+    for asset_type, asset_id in result:
+        groups[asset_type].append(asset_id)
+    return groups
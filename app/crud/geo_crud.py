@@ -1,57 +1,146 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import text
-from app.schemas.geo_schemas import GeoZoneCreate, GeoZoneResponse, GeoAlertResponse
+from app.schemas.geo_schemas import GeoZoneCreate, GeoZoneResponse, GeoAlertResponse, ZoneFeatureCollection
 from app.models.geo_models import GeoZone, GeoAlert
-from app.models.locations_model import AssetLocation
+from app.crud.locations_crud import get_latest_asset_location, as_utc
 from datetime import datetime
-from sqlalchemy import func
+from sqlalchemy import String, bindparam, func, insert, select, tuple_, update, false
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from fastapi import HTTPException
-from sqlalchemy import text
-from geoalchemy2 import WKTElement
+from typing import List, Optional, Tuple
+import json
+import os
 
-def create_geo_zone(db: Session, zone: GeoZoneCreate):
-    coords = ",".join([f"{lon} {lat}" for lon, lat in zone.coordinates])
-    wkt_polygon = f"SRID=4326;POLYGON(({coords}))"
-    
-    db_zone = GeoZone(
-        asset_id=zone.asset_id,
-        name=zone.name,
-        zone=wkt_polygon
-    )
-    db.add(db_zone)
-    db.commit()
-    db.refresh(db_zone)
+# "ingest": check each written location against its asset's zones in the
+# ingest transaction. "sweep": rely on the periodic reconciliation only.
+GEOFENCE_MODE = os.getenv("GEOFENCE_MODE", "ingest")
 
-    result = db.execute(text(f"SELECT ST_AsText(zone) FROM geo_zones WHERE id = {db_zone.id}")).scalar()
-    
-    result = result.strip("POLYGON(()))")
-    result_coords = result.split(",")
+def polygon_rings(rings: List[List[List[float]]], index: int = 0) -> List[List[List[float]]]:
+    # Closes open rings and rejects what PostGIS would refuse to parse, so a
+    # bad feature is reported by position instead of failing the whole insert.
+    closed = []
+    for ring in rings:
+        if any(len(point) < 2 or not is_valid_coordinate(point[1], point[0]) for point in ring):
+            raise HTTPException(status_code=400, detail=f"Feature {index}: coordinates must be [longitude, latitude] within range")
+        ring = [list(point[:2]) for point in ring]
+        if ring and ring[0] != ring[-1]:
+            ring.append(ring[0])
+        if len(ring) < 4:
+            raise HTTPException(status_code=400, detail=f"Feature {index}: a polygon ring needs at least 3 distinct positions")
+        closed.append(ring)
+    return closed
 
-    coordinates = [[float(x) for x in coord.strip().split()] for coord in result_coords]
+async def find_invalid_polygons(db: AsyncSession, geometries: List[str]) -> List[dict]:
+    result = await db.execute(text("""
+        SELECT t.i - 1 AS index, ST_IsValidReason(ST_GeomFromGeoJSON(t.geometry)) AS reason
+        FROM unnest(CAST(:geometries AS text[])) WITH ORDINALITY AS t(geometry, i)
+        WHERE NOT ST_IsValid(ST_GeomFromGeoJSON(t.geometry))
+    """), {"geometries": geometries})
+    return [dict(row) for row in result.mappings().all()]
 
-    return GeoZoneResponse(
-        id=db_zone.id,
-        asset_id=db_zone.asset_id,
-        name=db_zone.name,
-        coordinates=coordinates,
-        created_at=db_zone.created_at
-    )
+async def insert_geo_zones(db: AsyncSession, zones: List[dict], simplify_tolerance: Optional[float] = None) -> List[GeoZoneResponse]:
+    # zones: asset_id, name and rings (closed, as from polygon_rings). One
+    # multi-row INSERT for the lot; coordinates in the response come from the
+    # input, or from RETURNING when the server simplified them.
+    geometries = [json.dumps({"type": "Polygon", "coordinates": zone["rings"]}) for zone in zones]
+    invalid = await find_invalid_polygons(db, geometries)
+    if invalid:
+        raise HTTPException(status_code=400, detail={"error": "Invalid polygons", "features": invalid})
+
+    geometry = func.ST_SetSRID(func.ST_GeomFromGeoJSON(bindparam("geojson", type_=String)), 4326)
+    if simplify_tolerance:
+        geometry = func.ST_SimplifyPreserveTopology(geometry, simplify_tolerance)
+
+    returning = [GeoZone.id, GeoZone.asset_id, GeoZone.name, GeoZone.created_at]
+    if simplify_tolerance:
+        returning.append(func.ST_AsGeoJSON(GeoZone.zone).label("geojson"))
+    stmt = insert(GeoZone).values(zone=geometry).returning(*returning, sort_by_parameter_order=True)
+    rows = (await db.execute(stmt, [
+        {"asset_id": zone["asset_id"], "name": zone.get("name"), "geojson": geojson}
+        for zone, geojson in zip(zones, geometries)
+    ])).mappings().all()
+
+    # New zones can flip an asset's in/out state without any new point.
+    asset_ids = sorted({zone["asset_id"] for zone in zones})
+    await apply_geofence_transitions(db, await evaluate_geofence_transitions(db, asset_ids=asset_ids))
+
+    return [
+        GeoZoneResponse(
+            id=row["id"],
+            asset_id=row["asset_id"],
+            name=row["name"],
+            coordinates=json.loads(row["geojson"])["coordinates"][0] if simplify_tolerance else zone["rings"][0],
+            created_at=row["created_at"],
+        )
+        for row, zone in zip(rows, zones)
+    ]
+
+async def create_geo_zone(db: AsyncSession, zone: GeoZoneCreate):
+    db_zone = (await insert_geo_zones(db, [{
+        "asset_id": zone.asset_id,
+        "name": zone.name,
+        "rings": polygon_rings([zone.coordinates]),
+    }]))[0]
+    await db.commit()
+    return db_zone
 
-def check_asset_in_zone(db: Session, asset_id: int):
-    latest_location = db.query(
-        AssetLocation,
-        func.ST_X(AssetLocation.location).label("longitude"),
-        func.ST_Y(AssetLocation.location).label("latitude")
-    ).filter(
-        AssetLocation.asset_id == asset_id
-    ).order_by(
-        AssetLocation.timestamp.desc()
-    ).first()
+async def import_geo_zones(db: AsyncSession, collection: ZoneFeatureCollection, default_asset_id: Optional[int] = None, simplify_tolerance: Optional[float] = None) -> List[GeoZoneResponse]:
+    zones = []
+    for index, feature in enumerate(collection.features):
+        properties = feature.properties or {}
+        asset_id = properties.get("asset_id", default_asset_id)
+        if asset_id is None:
+            raise HTTPException(status_code=400, detail=f"Feature {index}: no asset_id in properties and no default asset_id given")
+        try:
+            asset_id = int(asset_id)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail=f"Feature {index}: asset_id must be an integer")
+        name = properties.get("name")
+        zones.append({
+            "asset_id": asset_id,
+            "name": str(name) if name is not None else None,
+            "rings": polygon_rings(feature.geometry.coordinates, index),
+        })
+
+    created = await insert_geo_zones(db, zones, simplify_tolerance)
+    await db.commit()
+    return created
+
+async def get_zones_geojson(db: AsyncSession, asset_id: Optional[int] = None, bbox: Optional[Tuple[float, float, float, float]] = None) -> str:
+    # The FeatureCollection is assembled by PostGIS and passed through as
+    # text; nothing is parsed or re-serialized in Python.
+    filters = []
+    params = {}
+    if asset_id is not None:
+        filters.append("AND asset_id = :asset_id")
+        params["asset_id"] = asset_id
+    if bbox is not None:
+        filters.append("AND zone && ST_MakeEnvelope(:min_lon, :min_lat, :max_lon, :max_lat, 4326)")
+        params.update(zip(("min_lon", "min_lat", "max_lon", "max_lat"), bbox))
+
+    query = text("""
+        SELECT json_build_object(
+            'type', 'FeatureCollection',
+            'features', COALESCE(json_agg(json_build_object(
+                'type', 'Feature',
+                'id', id,
+                'geometry', ST_AsGeoJSON(zone)::json,
+                'properties', json_build_object('asset_id', asset_id, 'name', name, 'created_at', created_at)
+            ) ORDER BY id), '[]'::json)
+        )::text
+        FROM geo_zones
+        WHERE TRUE
+        {filters}
+    """.format(filters="\n        ".join(filters)))
+    return (await db.execute(query, params)).scalar()
+
+async def check_asset_in_zone(db: AsyncSession, asset_id: int):
+    latest_location = await get_latest_asset_location(db, asset_id)
 
     if not latest_location:
         raise HTTPException(status_code=404, detail="No recent location found for asset")
 
-    _, longitude, latitude = latest_location
+    longitude, latitude = latest_location.longitude, latest_location.latitude
 
     query = text("""
         SELECT COUNT(*)
@@ -60,56 +149,258 @@ def check_asset_in_zone(db: Session, asset_id: int):
         AND ST_Contains(zone, ST_SetSRID(ST_MakePoint(:longitude, :latitude), 4326))
     """)
 
-    result = db.execute(query, {
+    result = (await db.execute(query, {
         "asset_id": asset_id,
         "longitude": longitude,
         "latitude": latitude
-    }).scalar()
+    })).scalar()
 
     return bool(result), longitude, latitude
 
 def is_valid_coordinate(lat, lon):
     return -90 <= lat <= 90 and -180 <= lon <= 180
 
-def create_geo_alert(db: Session, asset_id: int, alert_type: str, message: str):
-    latest_location = db.query(AssetLocation).filter(
-        AssetLocation.asset_id == asset_id
-    ).order_by(
-        AssetLocation.timestamp.desc()
-    ).first()
+async def create_geo_alert(db: AsyncSession, asset_id: int, alert_type: str, message: str):
+    latest_location = await get_latest_asset_location(db, asset_id)
 
     if not latest_location:
         raise HTTPException(status_code=404, detail="No recent location found for asset")
     
-    query = db.execute(
-        text("SELECT ST_Y(location), ST_X(location) FROM asset_locations WHERE id = :id"),
-        {"id": latest_location.id}
-    )
-    latitude, longitude = query.fetchone()
+    latitude, longitude = latest_location.latitude, latest_location.longitude
 
     if not is_valid_coordinate(latitude, longitude):
         raise HTTPException(status_code=400, detail="Invalid latitude or longitude values.")
     
-    db_alert = GeoAlert(
-        asset_id=asset_id,
-        alert_type=alert_type,
-        message=message,
-        triggered_at=datetime.utcnow(),
-        resolved=False,
+    db_alert = (await open_alerts(db, [{
+        "asset_id": asset_id,
+        "alert_type": alert_type,
+        "message": message,
+        "latitude": latitude,
+        "longitude": longitude,
+    }]))[0]
+    await db.commit()
+
+    return GeoAlertResponse.model_validate(db_alert)
+
+async def open_alerts(db: AsyncSession, alerts: List[dict]):
+    # Opens an alert per (asset_id, alert_type), or bumps the one already
+    # open via the uq_geo_alert_open partial index instead of adding a row.
+    # A bumped alert keeps the coordinates it was triggered at.
+    rows = {(a["asset_id"], a["alert_type"]): a for a in alerts}
+    if not rows:
+        return []
+
+    stmt = pg_insert(GeoAlert).values([
+        {
+            "asset_id": row["asset_id"],
+            "alert_type": row["alert_type"],
+            "message": row["message"],
+            "latitude": row.get("latitude"),
+            "longitude": row.get("longitude"),
+            "resolved": False,
+        }
+        for row in rows.values()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[GeoAlert.asset_id, GeoAlert.alert_type],
+        index_where=GeoAlert.resolved == false(),
+        set_={
+            "message": stmt.excluded.message,
+            "last_seen_at": func.now(),
+            "occurrences": GeoAlert.occurrences + 1,
+        },
+    ).returning(GeoAlert)
+    return (await db.execute(stmt)).scalars().all()
+
+async def resolve_alerts(db: AsyncSession, asset_ids: List[int], alert_type: str) -> int:
+    if not asset_ids:
+        return 0
+    result = await db.execute(
+        update(GeoAlert)
+        .where(
+            GeoAlert.asset_id.in_(asset_ids),
+            GeoAlert.alert_type == alert_type,
+            GeoAlert.resolved == false(),
+        )
+        .values(resolved=True, resolved_at=func.now())
+        .execution_options(synchronize_session=False)
     )
-    db.add(db_alert)
-    db.commit()
-    db.refresh(db_alert)
-
-    return GeoAlertResponse(
-        id=db_alert.id,
-        asset_id=db_alert.asset_id,
-        alert_type=db_alert.alert_type,
-        message=db_alert.message,
-        latitude=latitude,
-        longitude=longitude,
-        triggered_at=db_alert.triggered_at,
-        resolved=db_alert.resolved,
+    return result.rowcount
+
+async def get_alerts_for_asset(
+    db: AsyncSession,
+    asset_id: int,
+    alert_type: Optional[str] = None,
+    resolved: Optional[bool] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    limit: int = 100,
+    before: Optional[Tuple[datetime, int]] = None,
+) -> List[GeoAlert]:
+    # Newest first on idx_geo_alert_asset_triggered; `before` is the
+    # (triggered_at, id) of the last alert already returned.
+    query = select(GeoAlert).where(GeoAlert.asset_id == asset_id)
+    if alert_type:
+        query = query.where(GeoAlert.alert_type == alert_type)
+    if resolved is not None:
+        query = query.where(GeoAlert.resolved == resolved)
+    if start_time:
+        query = query.where(GeoAlert.triggered_at >= as_utc(start_time))
+    if end_time:
+        query = query.where(GeoAlert.triggered_at <= as_utc(end_time))
+    if before:
+        query = query.where(tuple_(GeoAlert.triggered_at, GeoAlert.id) < tuple_(as_utc(before[0]), before[1]))
+    query = query.order_by(GeoAlert.triggered_at.desc(), GeoAlert.id.desc()).limit(limit)
+    return list((await db.execute(query)).scalars().all())
+
+async def open_stale_alerts(db: AsyncSession, threshold: datetime, shard: Optional[Tuple[int, int]] = None) -> int:
+    # shard: (index, count); only assets with id % count == index.
+    params = {"threshold": threshold}
+    if shard is not None:
+        params["shard_index"], params["shard_count"] = shard
+    result = await db.execute(text("""
+        INSERT INTO geo_alerts (asset_id, alert_type, message, latitude, longitude, triggered_at, resolved)
+        SELECT a.id, 'stale_data', 'Asset ' || a.id || ' has no updates for 10+ minutes', lp.latitude, lp.longitude, now(), false
+        FROM assets a
+        LEFT JOIN asset_last_positions lp ON lp.asset_id = a.id
+        WHERE (lp.asset_id IS NULL OR lp.timestamp < :threshold)
+        {shard_filter}
+        ON CONFLICT (asset_id, alert_type) WHERE resolved = false
+        DO UPDATE SET last_seen_at = now(), occurrences = geo_alerts.occurrences + 1
+    """.format(shard_filter="AND a.id % :shard_count = :shard_index" if shard is not None else "")), params)
+    return result.rowcount
+
+async def evaluate_geofence_transitions(db: AsyncSession, asset_ids: Optional[List[int]] = None, since: Optional[datetime] = None, shard: Optional[Tuple[int, int]] = None) -> List[dict]:
+    # Re-checks the latest position of the selected assets against their own
+    # zones, flips asset_last_positions.in_zone where it changed and returns
+    # only those changes. Unchanged assets cost nothing beyond the check.
+    filters = []
+    params = {}
+    if asset_ids is not None:
+        filters.append("AND lp.asset_id = ANY(:asset_ids)")
+        params["asset_ids"] = list(asset_ids)
+    if since is not None:
+        filters.append("AND lp.updated_at > :since")
+        params["since"] = since
+    if shard is not None:
+        filters.append("AND lp.asset_id % :shard_count = :shard_index")
+        params["shard_index"], params["shard_count"] = shard
+
+    query = text("""
+        WITH candidates AS (
+            SELECT lp.asset_id, lp.longitude, lp.latitude, lp.in_zone AS was_in_zone,
+                   EXISTS (
+                       SELECT 1 FROM geo_zones gz
+                       WHERE gz.asset_id = lp.asset_id
+                       AND ST_Contains(gz.zone, lp.location)
+                   ) AS now_in_zone
+            FROM asset_last_positions lp
+            WHERE EXISTS (SELECT 1 FROM geo_zones gz WHERE gz.asset_id = lp.asset_id)
+            {filters}
+        ),
+        changed AS (
+            UPDATE asset_last_positions lp
+            SET in_zone = c.now_in_zone
+            FROM candidates c
+            WHERE lp.asset_id = c.asset_id
+            AND lp.in_zone IS DISTINCT FROM c.now_in_zone
+            RETURNING lp.asset_id
+        )
+        SELECT c.asset_id, c.longitude, c.latitude, c.was_in_zone, c.now_in_zone
+        FROM candidates c
+        JOIN changed ON changed.asset_id = c.asset_id
+    """.format(filters="\n            ".join(filters)))
+
+    return [dict(row) for row in (await db.execute(query, params)).mappings().all()]
+
+async def apply_geofence_transitions(db: AsyncSession, transitions: List[dict]) -> int:
+    exits = [
+        {
+            "asset_id": t["asset_id"],
+            "alert_type": "exit_zone",
+            "message": f"Asset {t['asset_id']} exited geo-fence at {t['longitude']},{t['latitude']}",
+            "latitude": t["latitude"],
+            "longitude": t["longitude"],
+        }
+        for t in transitions if not t["now_in_zone"]
+    ]
+    entered = [t["asset_id"] for t in transitions if t["now_in_zone"]]
+
+    await open_alerts(db, exits)
+    await resolve_alerts(db, entered, "exit_zone")
+    return len(exits)
+
+async def check_geofences_on_ingest(db: AsyncSession, asset_ids: List[int]) -> int:
+    if GEOFENCE_MODE != "ingest" or not asset_ids:
+        return 0
+    return await apply_geofence_transitions(db, await evaluate_geofence_transitions(db, asset_ids=asset_ids))
+
+# Spatial searches over asset_last_positions. Distances are on the spheroid:
+# geography(location) matches the idx_last_position_geog expression index,
+# bbox searches use the plain geometry index.
+NEARBY_ASSETS_SQL = """
+    SELECT a.id AS asset_id, a.name, a.asset_type, a.status,
+           lp.longitude, lp.latitude, lp.timestamp,
+           {distance} AS distance_m
+    FROM asset_last_positions lp
+    JOIN assets a ON a.id = lp.asset_id
+    WHERE {where}
+    {asset_type_filter}
+    {status_filter}
+    ORDER BY {order_by}
+    LIMIT :limit
+"""
+
+SEARCH_POINT = "geography(ST_SetSRID(ST_MakePoint(:longitude, :latitude), 4326))"
+
+async def _search_assets(db: AsyncSession, where: str, order_by: str, params: dict, distance: str = "NULL::float", asset_type: Optional[str] = None, status: Optional[str] = None) -> List[dict]:
+    query = text(NEARBY_ASSETS_SQL.format(
+        distance=distance,
+        where=where,
+        asset_type_filter="AND a.asset_type = :asset_type" if asset_type else "",
+        status_filter="AND a.status = :status" if status else "",
+        order_by=order_by,
+    ))
+    if asset_type:
+        params["asset_type"] = asset_type
+    if status:
+        params["status"] = status
+    return [dict(row) for row in (await db.execute(query, params)).mappings().all()]
+
+async def find_nearest_assets(db: AsyncSession, longitude: float, latitude: float, limit: int = 10, max_distance_m: Optional[float] = None, asset_type: Optional[str] = None, status: Optional[str] = None) -> List[dict]:
+    # KNN: the index returns rows in distance order, so only about `limit`
+    # rows are read whatever the fleet size.
+    where = "TRUE"
+    params = {"longitude": longitude, "latitude": latitude, "limit": limit}
+    if max_distance_m is not None:
+        where = f"ST_DWithin(geography(lp.location), {SEARCH_POINT}, :radius)"
+        params["radius"] = max_distance_m
+    return await _search_assets(
+        db, where, f"geography(lp.location) <-> {SEARCH_POINT}", params,
+        distance=f"ST_Distance(geography(lp.location), {SEARCH_POINT})",
+        asset_type=asset_type, status=status,
     )
 
+async def find_assets_within_radius(db: AsyncSession, longitude: float, latitude: float, radius_m: float, limit: int = 1000, asset_type: Optional[str] = None, status: Optional[str] = None) -> List[dict]:
+    return await _search_assets(
+        db,
+        f"ST_DWithin(geography(lp.location), {SEARCH_POINT}, :radius)",
+        "distance_m, a.id",
+        {"longitude": longitude, "latitude": latitude, "radius": radius_m, "limit": limit},
+        distance=f"ST_Distance(geography(lp.location), {SEARCH_POINT})",
+        asset_type=asset_type, status=status,
+    )
 
+async def find_assets_in_bbox(db: AsyncSession, min_longitude: float, min_latitude: float, max_longitude: float, max_latitude: float, limit: int = 1000, asset_type: Optional[str] = None, status: Optional[str] = None) -> List[dict]:
+    params = {"min_lat": min_latitude, "max_lat": max_latitude, "limit": limit}
+    if min_longitude <= max_longitude:
+        where = "lp.location && ST_MakeEnvelope(:min_lon, :min_lat, :max_lon, :max_lat, 4326)"
+        params.update(min_lon=min_longitude, max_lon=max_longitude)
+    else:
+        # Viewport crossing the antimeridian: search both halves.
+        where = (
+            "(lp.location && ST_MakeEnvelope(:min_lon, :min_lat, 180, :max_lat, 4326)"
+            " OR lp.location && ST_MakeEnvelope(-180, :min_lat, :max_lon, :max_lat, 4326))"
+        )
+        params.update(min_lon=min_longitude, max_lon=max_longitude)
+    return await _search_assets(db, where, "a.id", params, asset_type=asset_type, status=status)
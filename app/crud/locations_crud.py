@@ -1,59 +1,153 @@
-from sqlalchemy.orm import Session
-from geoalchemy2.functions import ST_Point
-from datetime import datetime
-from app.models.locations_model import AssetLocation
-from app.schemas.locations_schema import LocationCreate, LocationResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from app.models.locations_model import AssetLocation, AssetLastPosition
+from app.schemas.locations_schema import LocationResponse, LocationBatchItem
 from sqlalchemy import text
+from app.services.position_cache import last_position_cache
 
-def create_asset_location(db: Session, asset_id: int, location: LocationCreate):
-    point = f"SRID=4326;POINT({location.longitude} {location.latitude})"
-    db_location = AssetLocation(
-        asset_id=asset_id,
-        location=point,
-        timestamp=location.timestamp or datetime.utcnow(),
-        additional_data=location.additional_data or {}
+def as_utc(value: datetime) -> datetime:
+    # Naive timestamps from devices are taken to be UTC.
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+async def insert_asset_locations(db: AsyncSession, locations: List[LocationBatchItem]) -> List[LocationResponse]:
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "asset_id": loc.asset_id,
+            "location": f"SRID=4326;POINT({loc.longitude} {loc.latitude})",
+            "timestamp": as_utc(loc.timestamp) if loc.timestamp else now,
+            "additional_data": loc.additional_data or {},
+        }
+        for loc in locations
+    ]
+
+    # executemany + RETURNING is batched into multi-row INSERTs by SQLAlchemy,
+    # so coordinates come back without a second SELECT per point.
+    stmt = insert(AssetLocation).returning(
+        AssetLocation.id,
+        AssetLocation.asset_id,
+        func.ST_X(AssetLocation.location).label("longitude"),
+        func.ST_Y(AssetLocation.location).label("latitude"),
+        AssetLocation.timestamp,
+        AssetLocation.additional_data,
+        sort_by_parameter_order=True,
+    )
+    results = (await db.execute(stmt, rows)).mappings().all()
+    return [LocationResponse(**row) for row in results]
+
+async def upsert_last_positions(db: AsyncSession, locations: List[LocationResponse]):
+    latest = {}
+    for loc in locations:
+        current = latest.get(loc.asset_id)
+        if current is None or loc.timestamp >= current.timestamp:
+            latest[loc.asset_id] = loc
+    if not latest:
+        return
+
+    stmt = pg_insert(AssetLastPosition).values([
+        {
+            "asset_id": loc.asset_id,
+            "location_id": loc.id,
+            "timestamp": loc.timestamp,
+            "location": f"SRID=4326;POINT({loc.longitude} {loc.latitude})",
+            "longitude": loc.longitude,
+            "latitude": loc.latitude,
+            "additional_data": loc.additional_data or {},
+        }
+        for loc in latest.values()
+    ])
+    # Late-arriving points must not move the asset backwards in time.
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AssetLastPosition.asset_id],
+        set_={
+            "location_id": stmt.excluded.location_id,
+            "timestamp": stmt.excluded.timestamp,
+            "location": stmt.excluded.location,
+            "longitude": stmt.excluded.longitude,
+            "latitude": stmt.excluded.latitude,
+            "additional_data": stmt.excluded.additional_data,
+            "updated_at": func.now(),
+        },
+        where=AssetLastPosition.timestamp <= stmt.excluded.timestamp,
     )
-    db.add(db_location)
-    db.commit()
-    db.refresh(db_location)
-    return db_location
+    await db.execute(stmt)
+
+async def backfill_last_positions(db: AsyncSession):
+    if (await db.execute(select(AssetLastPosition.asset_id).limit(1))).first():
+        return
+    await db.execute(text("""
+        INSERT INTO asset_last_positions (asset_id, location_id, timestamp, location, longitude, latitude, additional_data)
+        SELECT DISTINCT ON (asset_id)
+               asset_id, id, timestamp, location, ST_X(location), ST_Y(location), additional_data
+        FROM asset_locations
+        WHERE location IS NOT NULL AND timestamp IS NOT NULL
+        ORDER BY asset_id, timestamp DESC
+        ON CONFLICT (asset_id) DO NOTHING
+    """))
+    await db.commit()
+
+async def get_latest_asset_location(db: AsyncSession, asset_id: int):
+    cached = last_position_cache.get(asset_id)
+    if cached is not None:
+        return cached
 
-def get_latest_asset_location(db: Session, asset_id: int):
-    result = db.execute(
+    result = (await db.execute(
         text("""
-            SELECT id, asset_id, ST_X(location) AS longitude, ST_Y(location) AS latitude, timestamp, additional_data
-            FROM asset_locations
+            SELECT location_id AS id, asset_id, longitude, latitude, timestamp, additional_data
+            FROM asset_last_positions
             WHERE asset_id = :asset_id
-            ORDER BY timestamp DESC
-            LIMIT 1
         """),
         {"asset_id": asset_id}
-    ).mappings().first()
+    )).mappings().first()
     
     if result:
-        return LocationResponse(**result)
+        location = LocationResponse(**result)
+        last_position_cache.set(location)
+        return location
     return None
 
-def get_asset_location_history(db: Session, asset_id: int, start_time: datetime = None, end_time: datetime = None, limit: int = 100):
+async def get_asset_location_history(db: AsyncSession, asset_id: int, start_time: datetime = None, end_time: datetime = None, limit: int = 100, before: Optional[Tuple[datetime, int]] = None):
+    # Newest first; `before` is the (timestamp, id) of the last row already
+    # returned and seeks past it on idx_asset_locations_asset_ts.
     query = text("""
         SELECT id, asset_id, ST_X(location) AS longitude, ST_Y(location) AS latitude, timestamp, additional_data
         FROM asset_locations
         WHERE asset_id = :asset_id
         {start_filter}
         {end_filter}
-        ORDER BY timestamp DESC
+        {seek_filter}
+        ORDER BY timestamp DESC, id DESC
         LIMIT :limit
     """.format(
         start_filter="AND timestamp >= :start_time" if start_time else "",
-        end_filter="AND timestamp <= :end_time" if end_time else ""
+        end_filter="AND timestamp <= :end_time" if end_time else "",
+        seek_filter="AND (timestamp, id) < (:before_ts, :before_id)" if before else ""
     ))
 
     params = {"asset_id": asset_id, "limit": limit}
     if start_time:
-        params["start_time"] = start_time
+        params["start_time"] = as_utc(start_time)
     if end_time:
-        params["end_time"] = end_time
+        params["end_time"] = as_utc(end_time)
+    if before:
+        params["before_ts"], params["before_id"] = as_utc(before[0]), before[1]
+
+    results = (await db.execute(query, params)).mappings().all()
 
-    results = db.execute(query, params).mappings().all()
+    return [LocationResponse(**row) for row in results]
 
-    return [LocationResponse(**row) for row in results]
\ No newline at end of file
+async def get_last_positions(db: AsyncSession, asset_ids: List[int]) -> List[dict]:
+    if not asset_ids:
+        return []
+    result = await db.execute(
+        text("""
+            SELECT asset_id, longitude, latitude, timestamp
+            FROM asset_last_positions
+            WHERE asset_id = ANY(:asset_ids)
+        """),
+        {"asset_ids": list(asset_ids)}
+    )
+    return [dict(row) for row in result.mappings().all()]
@@ -0,0 +1,40 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException
+
+# Opaque keyset cursors: the sort key of the last row of a page, JSON encoded
+# and base64url'd. Clients pass them back verbatim to get the next page.
+
+def encode_cursor(values: dict) -> str:
+    payload = {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in values.items()
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _parse_id(value) -> int:
+    # bool is an int subclass; a cursor never carries one.
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError("id must be an integer")
+    return value
+
+def _parse_ts(value) -> datetime:
+    if not isinstance(value, str):
+        raise ValueError("ts must be an ISO timestamp")
+    return datetime.fromisoformat(value)
+
+# How each cursor key is read back; a cursor is only valid if every key parses.
+CURSOR_FIELDS = {"id": _parse_id, "ts": _parse_ts}
+
+def decode_cursor(cursor: Optional[str], *keys: str) -> Optional[dict]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        return {key: CURSOR_FIELDS[key](payload[key]) for key in keys}
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,235 @@
+import os
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models.rollups_model import MovementRollup
+from app.schemas.locations_schema import LocationResponse
+from app.crud.locations_crud import as_utc
+
+GRANULARITIES = {"hour": 3600, "day": 86400}
+EARTH_RADIUS_M = 6_371_008.8
+# Below this a segment counts as idle time rather than moving time.
+MOVING_SPEED_MPS = float(os.getenv("ROLLUP_MOVING_SPEED_MPS", "0.5"))
+# Longer gaps still add distance but no moving/idle time or speed: nothing is
+# known about what the asset did in between.
+MAX_SEGMENT_GAP_SECONDS = float(os.getenv("ROLLUP_MAX_SEGMENT_GAP_SECONDS", "3600"))
+# Keeps multi-row upserts under asyncpg's 32767 bind parameter limit.
+UPSERT_CHUNK_ROWS = 1000
+
+Position = Tuple[float, float, datetime]
+
+def haversine_m(lon1, lat1, lon2, lat2) -> np.ndarray:
+    lon1, lat1, lon2, lat2 = map(np.radians, (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+async def lock_previous_positions(db: AsyncSession, asset_ids: List[int]) -> Dict[int, Position]:
+    # Row locks on the last positions serialize concurrent ingests of the same
+    # asset, so each segment is counted by exactly one transaction.
+    if not asset_ids:
+        return {}
+    result = await db.execute(
+        text("""
+            SELECT asset_id, longitude, latitude, timestamp
+            FROM asset_last_positions
+            WHERE asset_id = ANY(:asset_ids)
+            ORDER BY asset_id
+            FOR UPDATE
+        """),
+        {"asset_ids": list(asset_ids)}
+    )
+    return {row.asset_id: (row.longitude, row.latitude, row.timestamp) for row in result}
+
+def _asset_segments(points: List[LocationResponse], previous: Optional[Position]):
+    lon = np.array([p.longitude for p in points], dtype=float)
+    lat = np.array([p.latitude for p in points], dtype=float)
+    seconds = np.array([p.timestamp.timestamp() for p in points], dtype=float)
+
+    # Only points newer than the previous position extend the track. Late
+    # points still count towards point_count and the bounding box.
+    if previous is not None:
+        prev_seconds = previous[2].timestamp()
+        chained = np.flatnonzero(seconds > prev_seconds)
+        chain_lon = np.concatenate(([previous[0]], lon[chained]))
+        chain_lat = np.concatenate(([previous[1]], lat[chained]))
+        chain_seconds = np.concatenate(([prev_seconds], seconds[chained]))
+    else:
+        chained = np.arange(1, len(points))
+        chain_lon, chain_lat, chain_seconds = lon, lat, seconds
+
+    distance = np.zeros(len(points))
+    elapsed = np.zeros(len(points))
+    distance[chained] = haversine_m(chain_lon[:-1], chain_lat[:-1], chain_lon[1:], chain_lat[1:])
+    elapsed[chained] = np.diff(chain_seconds)
+    return lon, lat, seconds, distance, elapsed
+
+def compute_rollups(locations: Iterable[LocationResponse], previous: Dict[int, Position]) -> List[dict]:
+    by_asset = defaultdict(list)
+    for loc in locations:
+        by_asset[loc.asset_id].append(loc)
+
+    rows = []
+    for asset_id, points in by_asset.items():
+        points.sort(key=lambda p: (p.timestamp, p.id))
+        lon, lat, seconds, distance, elapsed = _asset_segments(points, previous.get(asset_id))
+
+        timed = (elapsed > 0) & (elapsed <= MAX_SEGMENT_GAP_SECONDS)
+        speed = np.divide(distance, elapsed, out=np.zeros_like(distance), where=timed)
+        moving = timed & (speed >= MOVING_SPEED_MPS)
+        moving_seconds = np.where(moving, elapsed, 0.0)
+        moving_distance = np.where(moving, distance, 0.0)
+        idle_seconds = np.where(timed & ~moving, elapsed, 0.0)
+
+        for granularity, size in GRANULARITIES.items():
+            buckets, index = np.unique((seconds // size) * size, return_inverse=True)
+            count = len(buckets)
+            max_speed = np.zeros(count)
+            np.maximum.at(max_speed, index, speed)
+            bounds = {}
+            for name, values, reducer, initial in (
+                ("min_longitude", lon, np.minimum, np.inf),
+                ("min_latitude", lat, np.minimum, np.inf),
+                ("max_longitude", lon, np.maximum, -np.inf),
+                ("max_latitude", lat, np.maximum, -np.inf),
+                ("first_seconds", seconds, np.minimum, np.inf),
+                ("last_seconds", seconds, np.maximum, -np.inf),
+            ):
+                bounds[name] = np.full(count, initial)
+                reducer.at(bounds[name], index, values)
+
+            sums = {
+                "point_count": np.bincount(index, minlength=count),
+                "distance_m": np.bincount(index, weights=distance, minlength=count),
+                "moving_distance_m": np.bincount(index, weights=moving_distance, minlength=count),
+                "moving_seconds": np.bincount(index, weights=moving_seconds, minlength=count),
+                "idle_seconds": np.bincount(index, weights=idle_seconds, minlength=count),
+            }
+            for i, bucket in enumerate(buckets):
+                rows.append({
+                    "asset_id": asset_id,
+                    "granularity": granularity,
+                    "bucket_start": datetime.fromtimestamp(bucket, tz=timezone.utc),
+                    "point_count": int(sums["point_count"][i]),
+                    "distance_m": float(sums["distance_m"][i]),
+                    "moving_distance_m": float(sums["moving_distance_m"][i]),
+                    "max_speed_mps": float(max_speed[i]),
+                    "moving_seconds": float(sums["moving_seconds"][i]),
+                    "idle_seconds": float(sums["idle_seconds"][i]),
+                    "min_longitude": float(bounds["min_longitude"][i]),
+                    "min_latitude": float(bounds["min_latitude"][i]),
+                    "max_longitude": float(bounds["max_longitude"][i]),
+                    "max_latitude": float(bounds["max_latitude"][i]),
+                    "first_timestamp": datetime.fromtimestamp(bounds["first_seconds"][i], tz=timezone.utc),
+                    "last_timestamp": datetime.fromtimestamp(bounds["last_seconds"][i], tz=timezone.utc),
+                })
+    return rows
+
+async def upsert_movement_rollups(db: AsyncSession, rows: List[dict]):
+    table = MovementRollup.__table__.c
+    for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+        stmt = pg_insert(MovementRollup).values(rows[start:start + UPSERT_CHUNK_ROWS])
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MovementRollup.asset_id, MovementRollup.granularity, MovementRollup.bucket_start],
+            set_={
+                "point_count": table.point_count + excluded.point_count,
+                "distance_m": table.distance_m + excluded.distance_m,
+                "moving_distance_m": table.moving_distance_m + excluded.moving_distance_m,
+                "max_speed_mps": func.greatest(table.max_speed_mps, excluded.max_speed_mps),
+                "moving_seconds": table.moving_seconds + excluded.moving_seconds,
+                "idle_seconds": table.idle_seconds + excluded.idle_seconds,
+                "min_longitude": func.least(table.min_longitude, excluded.min_longitude),
+                "min_latitude": func.least(table.min_latitude, excluded.min_latitude),
+                "max_longitude": func.greatest(table.max_longitude, excluded.max_longitude),
+                "max_latitude": func.greatest(table.max_latitude, excluded.max_latitude),
+                "first_timestamp": func.least(table.first_timestamp, excluded.first_timestamp),
+                "last_timestamp": func.greatest(table.last_timestamp, excluded.last_timestamp),
+                "updated_at": func.now(),
+            },
+        )
+        await db.execute(stmt)
+
+async def update_movement_rollups(db: AsyncSession, locations: List[LocationResponse], previous: Dict[int, Position]):
+    rows = compute_rollups(locations, previous)
+    if rows:
+        await upsert_movement_rollups(db, rows)
+
+async def rebuild_asset_rollups(db: AsyncSession, asset_id: int, chunk_rows: int = 10000) -> int:
+    # One-off recomputation from raw history, e.g. for points ingested before
+    # rollups existed. Walks the history in keyset chunks, oldest first.
+    await lock_previous_positions(db, [asset_id])
+    await db.execute(delete(MovementRollup).where(MovementRollup.asset_id == asset_id))
+
+    previous: Dict[int, Position] = {}
+    after = None
+    total = 0
+    while True:
+        result = await db.execute(
+            text("""
+                SELECT id, asset_id, ST_X(location) AS longitude, ST_Y(location) AS latitude, timestamp, additional_data
+                FROM asset_locations
+                WHERE asset_id = :asset_id AND location IS NOT NULL
+                {seek_filter}
+                ORDER BY timestamp, id
+                LIMIT :limit
+            """.format(seek_filter="AND (timestamp, id) > (:after_ts, :after_id)" if after else "")),
+            {"asset_id": asset_id, "limit": chunk_rows, **({"after_ts": after[0], "after_id": after[1]} if after else {})}
+        )
+        points = [LocationResponse(**row) for row in result.mappings().all()]
+        if not points:
+            break
+        await update_movement_rollups(db, points, previous)
+        last = points[-1]
+        previous = {asset_id: (last.longitude, last.latitude, last.timestamp)}
+        after = (last.timestamp, last.id)
+        total += len(points)
+    await db.commit()
+    return total
+
+async def get_asset_rollups(db: AsyncSession, asset_id: int, granularity: str, start_time: Optional[datetime] = None, end_time: Optional[datetime] = None) -> List[MovementRollup]:
+    query = select(MovementRollup).where(
+        MovementRollup.asset_id == asset_id,
+        MovementRollup.granularity == granularity,
+    )
+    if start_time:
+        query = query.where(MovementRollup.bucket_start >= as_utc(start_time))
+    if end_time:
+        query = query.where(MovementRollup.bucket_start < as_utc(end_time))
+    result = await db.execute(query.order_by(MovementRollup.bucket_start))
+    return list(result.scalars().all())
+
+async def get_fleet_rollups(db: AsyncSession, granularity: str, start_time: datetime, end_time: datetime, asset_type: Optional[str] = None) -> List[dict]:
+    query = text("""
+        SELECT r.asset_id,
+               SUM(r.point_count) AS point_count,
+               SUM(r.distance_m) AS distance_m,
+               SUM(r.moving_distance_m) AS moving_distance_m,
+               MAX(r.max_speed_mps) AS max_speed_mps,
+               SUM(r.moving_seconds) AS moving_seconds,
+               SUM(r.idle_seconds) AS idle_seconds,
+               MIN(r.min_longitude) AS min_longitude,
+               MIN(r.min_latitude) AS min_latitude,
+               MAX(r.max_longitude) AS max_longitude,
+               MAX(r.max_latitude) AS max_latitude,
+               MIN(r.first_timestamp) AS first_timestamp,
+               MAX(r.last_timestamp) AS last_timestamp
+        FROM asset_movement_rollups r
+        {asset_join}
+        WHERE r.granularity = :granularity
+        AND r.bucket_start >= :start_time
+        AND r.bucket_start < :end_time
+        {asset_filter}
+        GROUP BY r.asset_id
+        ORDER BY r.asset_id
+    """.format(
+        asset_join="JOIN assets a ON a.id = r.asset_id" if asset_type else "",
+        asset_filter="AND a.asset_type = :asset_type" if asset_type else "",
+    ))
+    params = {"granularity": granularity, "start_time": as_utc(start_time), "end_time": as_utc(end_time)}
+    if asset_type:
+        params["asset_type"] = asset_type
+    return [dict(row) for row in (await db.execute(query, params)).mappings().all()]
@@ -0,0 +1,63 @@
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import delete, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.models.tasks_model import TaskWatermark, TaskRun
+
+async def get_watermark(db: AsyncSession, name: str) -> Optional[datetime]:
+    result = await db.execute(select(TaskWatermark.value).where(TaskWatermark.name == name))
+    return result.scalar()
+
+async def set_watermark(db: AsyncSession, name: str, value: datetime):
+    stmt = pg_insert(TaskWatermark).values(name=name, value=value)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TaskWatermark.name],
+        set_={"value": stmt.excluded.value, "updated_at": func.now()},
+    )
+    await db.execute(stmt)
+
+async def claim_task_run(db: AsyncSession, name: str, shard: int, shard_count: int, interval_seconds: int, worker: str) -> Optional[int]:
+    # Claims the current interval slot (computed from the database clock so
+    # all workers agree) for this task shard. Returns the run id, or None if
+    # another worker already has it. NOT EXISTS keeps losers from burning ids.
+    result = await db.execute(
+        text("""
+            WITH current_slot AS (
+                SELECT to_timestamp(floor(extract(epoch FROM now()) / :interval) * :interval) AS slot
+            )
+            INSERT INTO task_runs (name, shard, shard_count, slot, worker, status, started_at)
+            SELECT :name, :shard, :shard_count, c.slot, :worker, 'running', now()
+            FROM current_slot c
+            WHERE NOT EXISTS (
+                SELECT 1 FROM task_runs r
+                WHERE r.name = :name AND r.shard = :shard AND r.slot = c.slot
+            )
+            ON CONFLICT (name, shard, slot) DO NOTHING
+            RETURNING id
+        """),
+        {"name": name, "shard": shard, "shard_count": shard_count, "interval": interval_seconds, "worker": worker}
+    )
+    run_id = result.scalar()
+    await db.commit()
+    return run_id
+
+async def finish_task_run(db: AsyncSession, run_id: int, status: str, assets_processed: Optional[int] = None, error: Optional[str] = None):
+    await db.execute(
+        update(TaskRun)
+        .where(TaskRun.id == run_id)
+        .values(status=status, finished_at=func.now(), assets_processed=assets_processed, error=error)
+    )
+    await db.commit()
+
+async def get_task_runs(db: AsyncSession, name: Optional[str] = None, limit: int = 100) -> List[TaskRun]:
+    query = select(TaskRun)
+    if name:
+        query = query.where(TaskRun.name == name)
+    query = query.order_by(TaskRun.started_at.desc(), TaskRun.id.desc()).limit(limit)
+    return list((await db.execute(query)).scalars().all())
+
+async def prune_task_runs(db: AsyncSession, older_than: datetime) -> int:
+    result = await db.execute(delete(TaskRun).where(TaskRun.started_at < older_than))
+    await db.commit()
+    return result.rowcount
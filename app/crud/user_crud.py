@@ -1,17 +1,22 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.users_model import User
-from app.schemas.user_schema import UserCreate, UserInDB
-from app.auth import get_password_hash, ADMIN_SECRET_CODE, verify_password
+from app.schemas.user_schema import UserCreate, UserAdminUpdate
+from app.models.users_model import Role
+from app.services.principal_cache import principal_cache
+from app.auth import ADMIN_SECRET_CODE
+from app.services.password_hasher import password_hasher
 
-def get_user(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
+async def get_user(db: AsyncSession, username: str):
+    result = await db.execute(select(User).where(User.username == username))
+    return result.scalars().first()
 
-def create_user(db: Session, user: UserCreate):
+async def create_user(db: AsyncSession, user: UserCreate):
     if user.role == "admin":
         if user.admin_secret_code != ADMIN_SECRET_CODE:
             raise ValueError("Invalid admin secret code")
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -20,12 +25,30 @@ def create_user(db: Session, user: UserCreate):
         disabled=False
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user(db, username)
-    if not user or not verify_password(password, user.password):
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await get_user(db, username)
+    if not user or not await password_hasher.verify(password, user.password):
         return False
-    return user
\ No newline at end of file
+    return user
+
+async def update_user(db: AsyncSession, username: str, update_data: UserAdminUpdate):
+    db_user = await get_user(db, username)
+    if not db_user:
+        return None
+
+    if update_data.role is not None:
+        db_user.role = Role(update_data.role.value)
+    if update_data.disabled is not None:
+        db_user.disabled = update_data.disabled
+    if update_data.password is not None:
+        db_user.password = await password_hasher.hash(update_data.password)
+
+    await db.commit()
+    await db.refresh(db_user)
+    # Role, disabled and password all change what this principal may do.
+    principal_cache.evict(username)
+    return db_user
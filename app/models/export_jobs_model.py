@@ -0,0 +1,31 @@
+from sqlalchemy import Column, BigInteger, Boolean, String, DateTime, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func, false, text
+from database import Base
+
+# Export jobs live here rather than in the process that runs them, so any
+# worker behind the load balancer can report on or cancel any job.
+class ExportJob(Base):
+    __tablename__ = "export_jobs"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)
+    owner = Column(String, nullable=False)
+    params = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    status = Column(String, nullable=False, server_default="queued")
+    error = Column(String, nullable=True)
+    worker = Column(String, nullable=False)
+    cancel_requested = Column(Boolean, nullable=False, server_default=false())
+    rows_written = Column(BigInteger, nullable=False, server_default="0")
+    bytes_written = Column(BigInteger, nullable=False, server_default="0")
+    estimated_rows = Column(BigInteger, nullable=True)
+    files = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('idx_export_jobs_owner_created', 'owner', created_at.desc()),
+        Index('idx_export_jobs_active', 'status', postgresql_where=text("status IN ('queued', 'running')")),
+    )
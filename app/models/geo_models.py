@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Index
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Index, Float
 from geoalchemy2 import Geometry
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, false, text
 from database import Base
 
 class GeoZone(Base):
@@ -14,6 +14,7 @@ class GeoZone(Base):
     
     __table_args__ = (
         Index('idx_geo_zone', 'zone', postgresql_using='gist'),  
+        Index('idx_geo_zone_asset_id', 'asset_id'),
     )
 
 class GeoAlert(Base):
@@ -23,5 +24,20 @@ class GeoAlert(Base):
     asset_id = Column(Integer, ForeignKey('assets.id'), nullable=False)
     alert_type = Column(String) 
     message = Column(String)
+    # Where the asset was when the alert was first triggered.
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
     triggered_at = Column(DateTime(timezone=True), server_default=func.now())
-    resolved = Column(Boolean, default=False)
\ No newline at end of file
+    resolved = Column(Boolean, default=False, server_default=false(), nullable=False)
+    last_seen_at = Column(DateTime(timezone=True), server_default=func.now())
+    occurrences = Column(Integer, default=1, server_default="1", nullable=False)
+    resolved_at = Column(DateTime(timezone=True), nullable=True)
+
+    # At most one open alert per (asset, alert_type); repeats update it.
+    __table_args__ = (
+        Index(
+            'uq_geo_alert_open', 'asset_id', 'alert_type',
+            unique=True, postgresql_where=text('resolved = false'),
+        ),
+        Index('idx_geo_alert_asset_triggered', 'asset_id', triggered_at.desc(), id.desc()),
+    )
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Float, Index, Boolean
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import JSONB
 from geoalchemy2 import Geometry
@@ -6,13 +6,40 @@ from sqlalchemy.sql import func
 from database import Base
 from app.models.assets_model import Asset
 
+# Range-partitioned by month on timestamp; partitions are created and retired
+# by app.services.partitions. The partition key has to be part of the primary
+# key, and indexes declared here are created on every partition.
 class AssetLocation(Base):
     __tablename__ = "asset_locations"
     
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     asset_id = Column(Integer, ForeignKey('assets.id'), nullable=False)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
-    location = Column(Geometry(geometry_type='POINT', srid=4326))
+    timestamp = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    location = Column(Geometry(geometry_type='POINT', srid=4326, spatial_index=False))
     additional_data = Column(JSONB)
 
-    asset = relationship("Asset", back_populates="locations")
\ No newline at end of file
+    asset = relationship("Asset", back_populates="locations")
+
+    __table_args__ = (
+        Index('idx_asset_locations_asset_ts', 'asset_id', timestamp.desc(), id.desc()),
+        Index('idx_asset_locations_location', 'location', postgresql_using='gist'),
+        {'postgresql_partition_by': 'RANGE (timestamp)'},
+    )
+
+class AssetLastPosition(Base):
+    __tablename__ = "asset_last_positions"
+
+    asset_id = Column(Integer, ForeignKey('assets.id', ondelete='CASCADE'), primary_key=True)
+    location_id = Column(Integer, nullable=False)
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+    location = Column(Geometry(geometry_type='POINT', srid=4326, spatial_index=False), nullable=False)
+    longitude = Column(Float, nullable=False)
+    latitude = Column(Float, nullable=False)
+    additional_data = Column(JSONB)
+    in_zone = Column(Boolean, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index('idx_last_position_location', 'location', postgresql_using='gist'),
+        Index('idx_last_position_geog', func.geography(location), postgresql_using='gist'),
+    )
@@ -0,0 +1,31 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Index
+from sqlalchemy.sql import func
+from database import Base
+
+# One row per asset per hour/day bucket, accumulated as points are ingested.
+# Segments (previous point -> new point) are counted in the bucket of the
+# point that ends them.
+class MovementRollup(Base):
+    __tablename__ = "asset_movement_rollups"
+
+    asset_id = Column(Integer, ForeignKey('assets.id', ondelete='CASCADE'), primary_key=True)
+    granularity = Column(String, primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    point_count = Column(Integer, nullable=False, server_default="0")
+    distance_m = Column(Float, nullable=False, server_default="0")
+    # Distance covered by the moving segments only, for average speed.
+    moving_distance_m = Column(Float, nullable=False, server_default="0")
+    max_speed_mps = Column(Float, nullable=False, server_default="0")
+    moving_seconds = Column(Float, nullable=False, server_default="0")
+    idle_seconds = Column(Float, nullable=False, server_default="0")
+    min_longitude = Column(Float, nullable=False)
+    min_latitude = Column(Float, nullable=False)
+    max_longitude = Column(Float, nullable=False)
+    max_latitude = Column(Float, nullable=False)
+    first_timestamp = Column(DateTime(timezone=True), nullable=False)
+    last_timestamp = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index('idx_movement_rollups_bucket', 'granularity', 'bucket_start'),
+    )
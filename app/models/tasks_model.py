@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from database import Base
+
+class TaskWatermark(Base):
+    __tablename__ = "task_watermarks"
+
+    name = Column(String, primary_key=True)
+    value = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+# One row per (task, shard, interval slot). The unique constraint is what
+# makes a run happen once per interval no matter how many workers try; the
+# rows double as run history.
+class TaskRun(Base):
+    __tablename__ = "task_runs"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    shard = Column(Integer, nullable=False, server_default="0")
+    shard_count = Column(Integer, nullable=False, server_default="1")
+    slot = Column(DateTime(timezone=True), nullable=False)
+    worker = Column(String, nullable=False)
+    status = Column(String, nullable=False, server_default="running")
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    assets_processed = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint('name', 'shard', 'slot', name='uq_task_run_slot'),
+        Index('idx_task_runs_name_started', 'name', started_at.desc()),
+    )
@@ -1,22 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from app.models.users_model import User
-from app.models.assets_model import Asset
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.schemas.user_schema import Principal
 from app.auth import get_current_admin_user, get_current_user
-from database import get_db
-from app.schemas.assets_schema import AssetResponse, AssetCreate, AssetUpdate
-from app.crud.assets_crud import get_assets, create_asset, get_asset, update_asset, delete_asset
+from async_database import get_async_db
+from app.schemas.assets_schema import AssetResponse, AssetCreate, AssetUpdate, AssetPage
+from app.crud.pagination import encode_cursor, decode_cursor
+from app.crud.assets_crud import get_assets, create_asset, get_asset, get_asset_by_unique_id, update_asset, delete_asset
 
 router = APIRouter()
 
 @router.post("/assets/", response_model=AssetResponse)
-def create_new_asset(asset: AssetCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_admin_user)):
-    db_asset = db.query(Asset).filter(Asset.unique_id == asset.unique_id).first()
+async def create_new_asset(asset: AssetCreate, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_admin_user)):
+    db_asset = await get_asset_by_unique_id(db, asset.unique_id)
     if db_asset:
         raise HTTPException(status_code=400, detail="Asset with this unique_id already exists")
     
-    new_asset = create_asset(db=db, asset_data=asset)
+    new_asset = await create_asset(db=db, asset_data=asset)
 
     return AssetResponse(
         id=new_asset.id,
@@ -28,33 +28,44 @@ def create_new_asset(asset: AssetCreate, db: Session = Depends(get_db), current_
         user_id=new_asset.user_id
     )
 
-@router.get("/assets/", response_model=List[AssetResponse])
-def read_assets(skip: int = 0,limit: int = 100, db: Session = Depends(get_db),current_user: User = Depends(get_current_user)):
-    assets = get_assets(db, skip=skip, limit=limit)
-    return assets
+@router.get("/assets/", response_model=AssetPage)
+async def read_assets(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    after = decode_cursor(cursor, "id")
+    assets = await get_assets(db, after_id=after["id"] if after else None, limit=limit + 1)
+
+    next_cursor = None
+    if len(assets) > limit:
+        assets = assets[:limit]
+        next_cursor = encode_cursor({"id": assets[-1].id})
+    return AssetPage(items=assets, next_cursor=next_cursor)
 
 @router.get("/assets/{asset_id}", response_model=AssetResponse)
-def read_asset(asset_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    db_asset = get_asset(db, asset_id=asset_id)
+async def read_asset(asset_id: int, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    db_asset = await get_asset(db, asset_id=asset_id)
     if db_asset is None:
         raise HTTPException(status_code=404, detail="Asset not found")
     return db_asset
 
 @router.put("/assets/{asset_id}", response_model=AssetResponse)
-def update_existing_asset(
+async def update_existing_asset(
     asset_id: int, 
     update_data: AssetUpdate, 
-    db: Session = Depends(get_db), 
-    current_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_async_db), 
+    current_user: Principal = Depends(get_current_admin_user)
 ):
-    db_asset = update_asset(db, asset_id, update_data)
+    db_asset = await update_asset(db, asset_id, update_data)
     if db_asset is None:
         raise HTTPException(status_code=404, detail="Asset not found")
     return db_asset
 
 @router.delete("/assets/{asset_id}")
-def delete_existing_asset(asset_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_admin_user)):
-    db_asset = delete_asset(db, asset_id=asset_id)
+async def delete_existing_asset(asset_id: int, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_admin_user)):
+    db_asset = await delete_asset(db, asset_id=asset_id)
     if db_asset is None:
         raise HTTPException(status_code=404, detail="Asset not found")
-    return {"message": "Asset deleted successfully"}
\ No newline at end of file
+    return {"message": "Asset deleted successfully"}
@@ -1,17 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from database import get_db
-from app.schemas.user_schema import Token, UserCreate, UserInDB
-from app.crud.user_crud import create_user, authenticate_user
-from app.auth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES,get_current_user,get_current_admin_user
+from async_database import get_async_db
+from app.schemas.user_schema import Token, UserCreate, UserInDB, UserAdminUpdate, Principal
+from app.crud.user_crud import create_user, authenticate_user, update_user
+from app.services.principal_cache import principal_cache
+from app.services.password_hasher import password_hasher
+from app.auth import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES,get_current_admin_user
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 @router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(),db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(),db: AsyncSession = Depends(get_async_db)):
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -26,8 +28,28 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/register", response_model=UserInDB)
-async def register_user(user: UserCreate,db: Session = Depends(get_db)):
+async def register_user(user: UserCreate,db: AsyncSession = Depends(get_async_db)):
     try:
-        return create_user(db, user)
+        return await create_user(db, user)
     except ValueError as e:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,detail=str(e))
+
+@router.patch("/users/{username}", response_model=UserInDB)
+async def update_user_admin(
+    username: str,
+    update_data: UserAdminUpdate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    db_user = await update_user(db, username, update_data)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return db_user
+
+@router.get("/principal-cache")
+async def principal_cache_stats(current_user: Principal = Depends(get_current_admin_user)):
+    return principal_cache.stats()
+
+@router.get("/hashing-stats")
+async def password_hashing_stats(current_user: Principal = Depends(get_current_admin_user)):
+    return password_hasher.stats()
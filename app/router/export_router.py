@@ -1,105 +1,143 @@
-import asyncio
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pathlib import Path
 import os
 from datetime import datetime
-from typing import Dict
-from app.services.export import FullDataExporter
+from typing import Dict, List, Optional
+from app.services.export import FullDataExporter, EXPORT_QUERIES, PARQUET_TYPES, duplicate_flattened_columns
+from app.services.export_jobs import ExportQueueFull, build_export_job_manager, job_to_dict
 from database import get_db_url
-from app.auth import get_current_user
-from app.models.users_model import User
+from app.auth import get_current_admin_user, get_current_user
+from app.models.users_model import Role
+from app.schemas.user_schema import Principal
 
 router = APIRouter(prefix="/export", tags=["Export"])
 
 EXPORT_DIR = Path(__file__).parent.parent.parent / "exports"
 os.makedirs(EXPORT_DIR, exist_ok=True)
+EXPORT_SUFFIXES = ('.csv', '.csv.gz', '.zip')
+EXPORT_MEDIA_TYPES = {'.gz': 'application/gzip', '.zip': 'application/zip'}
 
-def cleanup_file(filepath: str):
+exporter = FullDataExporter(db_url=get_db_url(), export_dir=EXPORT_DIR)
+jobs = build_export_job_manager(exporter.engine, EXPORT_DIR)
+
+async def submit_export(kind: str, current_user: Principal, params: dict, run) -> JSONResponse:
     try:
-        if os.path.exists(filepath):
-            os.remove(filepath)
-    except Exception as e:
-        print(f"Error cleaning up {filepath}: {e}")
+        job = await run_in_threadpool(jobs.submit, kind, current_user.username, params, run)
+    except ExportQueueFull:
+        raise HTTPException(429, detail="Too many export jobs in progress, retry later")
+    return JSONResponse(
+        status_code=202,
+        content={
+            "status": job["status"],
+            "job_id": job["id"],
+            "status_url": f"/export/jobs/{job['id']}",
+        },
+    )
 
-async def delayed_cleanup(filepath: str, delay: int = 3600):
-    await asyncio.sleep(delay)
-    cleanup_file(filepath)
+async def get_visible_job(job_id: str, current_user: Principal) -> dict:
+    job = await run_in_threadpool(jobs.get, job_id)
+    if job is None or (job["owner"] != current_user.username and current_user.role != Role.admin):
+        raise HTTPException(404, detail="Export job not found")
+    return job
 
-@router.post("/full-export")
+@router.post("/full-export", status_code=202)
 async def full_export(
-    background_tasks: BackgroundTasks,
-    current_user: User = Depends(get_current_user)
+    compress: bool = Query(False, description="gzip the CSV files"),
+    current_user: Principal = Depends(get_current_user)
 ):
-    try:
-        exporter = FullDataExporter(db_url=get_db_url(), export_dir=EXPORT_DIR)
-        exports = exporter.export_all_data()  
-        
-        for rel_path in exports.values():
-            full_path = EXPORT_DIR / rel_path
-            background_tasks.add_task(delayed_cleanup, str(full_path), 86400)
-        
-        return {
-            "status": "success",
-            "exports": {
-                name: {
-                    "filename": str(rel_path),
-                    "download_url": f"/export/download/{rel_path}"
-                } for name, rel_path in exports.items()
-            }
-        }
-    except Exception as e:
-        raise HTTPException(500, detail=str(e))
+    return await submit_export(
+        "full", current_user, {"compress": compress},
+        lambda progress: exporter.export_all_data(compress=compress, progress=progress),
+    )
 
-@router.post("/assets/{asset_id}")
+@router.post("/assets/{asset_id}", status_code=202)
 async def export_asset_data(
     asset_id: int,
-    background_tasks: BackgroundTasks,
-    current_user: User = Depends(get_current_user)
+    compress: bool = Query(False, description="gzip the CSV file"),
+    current_user: Principal = Depends(get_current_user)
 ):
-    try:
-        exporter = FullDataExporter(db_url=get_db_url(), export_dir= EXPORT_DIR)
-        rel_path = exporter.export_asset_data(asset_id)
-        full_path = EXPORT_DIR / rel_path
-        
-        background_tasks.add_task(delayed_cleanup, str(full_path))
-        
-        return {
-            "status": "success",
-            "filename": str(rel_path),
-            "download_url": f"/export/download/{rel_path}"
-        }
-    except Exception as e:
-        raise HTTPException(500, detail=str(e))
+    return await submit_export(
+        "asset", current_user, {"asset_id": asset_id, "compress": compress},
+        lambda progress: {"asset": exporter.export_asset_data(asset_id, compress=compress, progress=progress)},
+    )
 
-@router.post("/assets_all/{asset_id}")
-async def export_asset_data(
+@router.post("/assets_all/{asset_id}", status_code=202)
+async def export_asset_data_all(
     asset_id: int,
-    background_tasks: BackgroundTasks,
-    current_user: User = Depends(get_current_user)
+    compress: bool = Query(False, description="gzip the CSV file"),
+    current_user: Principal = Depends(get_current_user)
 ):
-    try:
-        exporter = FullDataExporter(get_db_url(), EXPORT_DIR)
-        filepath = exporter.export_asset_data_all(asset_id)
-        
-        background_tasks.add_task(delayed_cleanup, str(filepath))
-        
-        return {
-            "status": "success",
-            "filename": filepath.name,
-            "download_url": f"/export/download/{filepath.relative_to(EXPORT_DIR)}"
-        }
-    except Exception as e:
-        raise HTTPException(500, detail=str(e))
+    return await submit_export(
+        "asset_all", current_user, {"asset_id": asset_id, "compress": compress},
+        lambda progress: {"asset_all": exporter.export_asset_data_all(asset_id, compress=compress, progress=progress)},
+    )
+
+@router.post("/parquet", status_code=202)
+async def export_locations_parquet(
+    asset_id: Optional[int] = Query(None, description="Only export this asset"),
+    flatten: List[str] = Query([], description="additional_data keys to flatten, as key:type (float64, int64, bool, string)"),
+    current_user: Principal = Depends(get_current_user)
+):
+    columns = {}
+    for item in flatten:
+        key, _, type_name = item.partition(":")
+        type_name = type_name or "string"
+        if not key or type_name not in PARQUET_TYPES:
+            raise HTTPException(400, detail=f"Invalid flatten spec {item!r}, expected key:type with type in {sorted(PARQUET_TYPES)}")
+        if key in columns:
+            raise HTTPException(400, detail=f"additional_data key {key!r} is flattened more than once")
+        columns[key] = type_name
+    duplicates = duplicate_flattened_columns(columns)
+    if duplicates:
+        raise HTTPException(400, detail=f"additional_data keys {duplicates} flatten to the same column name")
+
+    return await submit_export(
+        "parquet", current_user, {"asset_id": asset_id, "flatten": columns},
+        lambda progress: {"locations": exporter.export_locations_parquet(columns, asset_id=asset_id, progress=progress)},
+    )
+
+@router.get("/jobs")
+async def list_export_jobs(current_user: Principal = Depends(get_current_user)):
+    owner = None if current_user.role == Role.admin else current_user.username
+    return [job_to_dict(job) for job in await run_in_threadpool(jobs.list, owner)]
+
+@router.get("/jobs/{job_id}")
+async def get_export_job(job_id: str, current_user: Principal = Depends(get_current_user)):
+    return job_to_dict(await get_visible_job(job_id, current_user))
+
+@router.delete("/jobs/{job_id}")
+async def cancel_export_job(job_id: str, current_user: Principal = Depends(get_current_user)):
+    job = await get_visible_job(job_id, current_user)
+    return job_to_dict(await run_in_threadpool(jobs.cancel, job["id"]))
+
+@router.get("/stream/{dataset}")
+def stream_export(
+    dataset: str,
+    compress: bool = Query(False, description="gzip the response body"),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    if dataset not in EXPORT_QUERIES:
+        raise HTTPException(404, detail=f"Unknown dataset, expected one of {sorted(EXPORT_QUERIES)}")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{dataset}_{timestamp}.csv" + (".gz" if compress else "")
+
+    return StreamingResponse(
+        exporter.stream_query_csv(EXPORT_QUERIES[dataset], compress=compress),
+        media_type="application/gzip" if compress else "text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 @router.get("/download/{filepath:path}")
 async def download_export(
     filepath: str,
     background_tasks: BackgroundTasks,
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     try:
-        if not filepath.endswith('.csv') or '..' in filepath:
+        if not filepath.endswith(EXPORT_SUFFIXES) or '..' in filepath:
             raise HTTPException(400, "Invalid file path")
         
         full_path = EXPORT_DIR / filepath
@@ -113,7 +151,7 @@ async def download_export(
             available_files = []
             for root, _, files in os.walk(EXPORT_DIR):
                 for f in files:
-                    if f.endswith('.csv'):
+                    if f.endswith(EXPORT_SUFFIXES):
                         rel_path = os.path.relpath(os.path.join(root, f), EXPORT_DIR)
                         available_files.append(rel_path)
             raise HTTPException(404, detail={
@@ -124,7 +162,7 @@ async def download_export(
         
         return FileResponse(
             full_path,
-            media_type='text/csv',
+            media_type=EXPORT_MEDIA_TYPES.get(full_path.suffix, 'text/csv'),
             filename=full_path.name
         )
     except HTTPException as he:
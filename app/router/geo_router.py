@@ -1,28 +1,69 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
 
-from database import get_db
-from app.models.users_model import User
-from app.models.geo_models import GeoAlert, GeoZone
-from app.schemas.geo_schemas import GeoZoneCreate, GeoZoneResponse, GeoAlertResponse
-from app.crud.geo_crud import create_geo_zone, check_asset_in_zone, create_geo_alert
-from app.auth import get_current_admin_user,get_current_user
-from sqlalchemy.sql import text
+from async_database import get_async_db
+from app.schemas.user_schema import Principal
+from app.schemas.geo_schemas import GeoZoneCreate, GeoZoneResponse, GeoAlertResponse, GeoAlertPage, NearbyAssetResponse, ZoneFeatureCollection, GeoZoneImportResponse
+from app.crud.pagination import encode_cursor, decode_cursor
+from app.crud.assets_crud import get_missing_asset_ids
+from app.crud.geo_crud import create_geo_zone, import_geo_zones, get_zones_geojson, create_geo_alert, get_alerts_for_asset, find_nearest_assets, find_assets_within_radius, find_assets_in_bbox
+from app.auth import get_current_user
 
 router = APIRouter(prefix="/geo", tags=["geo-fencing"])
 
+async def _unknown_assets_error(db: AsyncSession, asset_ids) -> HTTPException:
+    await db.rollback()
+    missing = await get_missing_asset_ids(db, asset_ids)
+    return HTTPException(status_code=404, detail={"error": "Unknown asset ids", "asset_ids": missing})
+
 @router.post("/geofence", response_model=GeoZoneResponse)
-def create_zone(
+async def create_zone(
     zone: GeoZoneCreate,
-    db: Session = Depends(get_db),  current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),  current_user: Principal = Depends(get_current_user)
+):
+    try:
+        return await create_geo_zone(db, zone)
+    except IntegrityError:
+        raise await _unknown_assets_error(db, [zone.asset_id])
+
+@router.post("/zones/import", response_model=GeoZoneImportResponse)
+async def import_zones(
+    collection: ZoneFeatureCollection,
+    asset_id: Optional[int] = Query(None, description="Asset for features without properties.asset_id"),
+    simplify_tolerance: Optional[float] = Query(None, gt=0, description="Simplify polygons with this tolerance, in degrees"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    try:
+        zones = await import_geo_zones(db, collection, asset_id, simplify_tolerance)
+    except IntegrityError:
+        asset_ids = {(feature.properties or {}).get("asset_id", asset_id) for feature in collection.features}
+        raise await _unknown_assets_error(db, (int(a) for a in asset_ids if a is not None))
+    return GeoZoneImportResponse(inserted=len(zones), zones=zones)
+
+@router.get("/zones", response_class=Response)
+async def zones_geojson(
+    asset_id: Optional[int] = Query(None),
+    min_longitude: Optional[float] = Query(None, ge=-180, le=180),
+    min_latitude: Optional[float] = Query(None, ge=-90, le=90),
+    max_longitude: Optional[float] = Query(None, ge=-180, le=180),
+    max_latitude: Optional[float] = Query(None, ge=-90, le=90),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    return create_geo_zone(db, zone)
+    bounds = (min_longitude, min_latitude, max_longitude, max_latitude)
+    if any(b is not None for b in bounds) and any(b is None for b in bounds):
+        raise HTTPException(status_code=400, detail="A bounding box needs all four of min/max longitude/latitude")
+    bbox = bounds if bounds[0] is not None else None
+    return Response(content=await get_zones_geojson(db, asset_id, bbox), media_type="application/geo+json")
 
 @router.get("/check/{asset_id}", response_model=GeoAlertResponse)
-def check_location(asset_id: int, db: Session = Depends(get_db)):
+async def check_location(asset_id: int, db: AsyncSession = Depends(get_async_db)):
     try:
-        alert_response = create_geo_alert(
+        alert_response = await create_geo_alert(
             db,
             asset_id,
             "Geo-fence Breach",
@@ -36,31 +77,74 @@ def check_location(asset_id: int, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/alerts/{asset_id}", response_model=List[GeoAlertResponse])
-def get_asset_alerts(asset_id: int, db: Session = Depends(get_db)):
-    query = text("""
-        SELECT ga.id, ga.asset_id, ga.alert_type, ga.message, 
-               ST_Y(al.location) AS latitude, ST_X(al.location) AS longitude, 
-               ga.triggered_at, ga.resolved
-        FROM geo_alerts ga
-        JOIN asset_locations al ON al.asset_id = ga.asset_id
-        WHERE ga.asset_id = :asset_id
-        ORDER BY ga.triggered_at DESC
-    """)
+@router.get("/alerts/{asset_id}", response_model=GeoAlertPage)
+async def get_asset_alerts(
+    asset_id: int,
+    alert_type: Optional[str] = Query(None),
+    resolved: Optional[bool] = Query(None),
+    start_time: Optional[datetime] = Query(None, description="Alerts triggered at or after this time"),
+    end_time: Optional[datetime] = Query(None, description="Alerts triggered at or before this time"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    before = decode_cursor(cursor, "ts", "id")
+    alerts = await get_alerts_for_asset(
+        db,
+        asset_id,
+        alert_type=alert_type,
+        resolved=resolved,
+        start_time=start_time,
+        end_time=end_time,
+        limit=limit + 1,
+        before=(before["ts"], before["id"]) if before else None,
+    )
 
-    result = db.execute(query, {"asset_id": asset_id}).fetchall()
+    next_cursor = None
+    if len(alerts) > limit:
+        alerts = alerts[:limit]
+        last = alerts[-1]
+        next_cursor = encode_cursor({"ts": last.triggered_at, "id": last.id})
+    return GeoAlertPage(items=alerts, next_cursor=next_cursor)
 
-    return [
-        GeoAlertResponse(
-            id=row.id,
-            asset_id=row.asset_id,
-            alert_type=row.alert_type,
-            message=row.message,
-            latitude=row.latitude,
-            longitude=row.longitude,
-            triggered_at=row.triggered_at,
-            resolved=row.resolved
-        ) for row in result
-    ]
+@router.get("/assets/nearest", response_model=List[NearbyAssetResponse])
+async def nearest_assets(
+    longitude: float = Query(..., ge=-180, le=180),
+    latitude: float = Query(..., ge=-90, le=90),
+    limit: int = Query(10, ge=1, le=1000),
+    max_distance_m: Optional[float] = Query(None, gt=0),
+    asset_type: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    return await find_nearest_assets(db, longitude, latitude, limit, max_distance_m, asset_type, status)
 
-    
+@router.get("/assets/within", response_model=List[NearbyAssetResponse])
+async def assets_within_radius(
+    longitude: float = Query(..., ge=-180, le=180),
+    latitude: float = Query(..., ge=-90, le=90),
+    radius_m: float = Query(..., gt=0, le=500_000),
+    limit: int = Query(1000, ge=1, le=10000),
+    asset_type: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    return await find_assets_within_radius(db, longitude, latitude, radius_m, limit, asset_type, status)
+
+@router.get("/assets/bbox", response_model=List[NearbyAssetResponse])
+async def assets_in_bbox(
+    min_longitude: float = Query(..., ge=-180, le=180),
+    min_latitude: float = Query(..., ge=-90, le=90),
+    max_longitude: float = Query(..., ge=-180, le=180),
+    max_latitude: float = Query(..., ge=-90, le=90),
+    limit: int = Query(1000, ge=1, le=10000),
+    asset_type: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    if min_latitude > max_latitude:
+        raise HTTPException(status_code=400, detail="min_latitude must not exceed max_latitude")
+    return await find_assets_in_bbox(db, min_longitude, min_latitude, max_longitude, max_latitude, limit, asset_type, status)
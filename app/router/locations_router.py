@@ -1,52 +1,81 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from typing import Optional
 from datetime import datetime
-from database import get_db
-from app.models.users_model import User
+from async_database import get_async_db
+from app.schemas.user_schema import Principal
 from app.auth import get_current_user
-from app.schemas.locations_schema import LocationCreate, LocationResponse
-from app.crud.locations_crud import create_asset_location, get_latest_asset_location, get_asset_location_history
-from sqlalchemy import text
+from app.schemas.locations_schema import LocationCreate, LocationResponse, LocationBatchCreate, LocationBatchResponse, LocationPage
+from app.crud.pagination import encode_cursor, decode_cursor
+from app.crud.locations_crud import get_latest_asset_location, get_asset_location_history
+from app.crud.assets_crud import get_missing_asset_ids
+from app.services.ingest import ingest_location, ingest_locations
+from fastapi.concurrency import run_in_threadpool
+from app.services.trajectory import DOWNSAMPLE_SOURCE_LIMIT, downsample_locations
 
 router = APIRouter(prefix="/track", tags=["tracking"])
 
-@router.post("/{asset_id}", response_model=LocationResponse)
-def post_location_update(asset_id: int,location: LocationCreate,db: Session = Depends(get_db),current_user: User = Depends(get_current_user)):
-    db_location = create_asset_location(db, asset_id=asset_id, location=location)
-    if not db_location:
-        raise HTTPException(status_code=404, detail="Failed to create asset location")
-    
-    result = db.execute(
-    text("SELECT ST_X(location), ST_Y(location) FROM asset_locations WHERE id = :id"),
-    {"id": db_location.id}).fetchone()
+async def _unknown_assets_error(db: AsyncSession, asset_ids) -> HTTPException:
+    await db.rollback()
+    missing = await get_missing_asset_ids(db, asset_ids)
+    return HTTPException(status_code=404, detail={"error": "Unknown asset ids", "asset_ids": missing})
+
+@router.post("/batch", response_model=LocationBatchResponse)
+async def post_location_batch(batch: LocationBatchCreate, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_user)):
+    try:
+        locations = await ingest_locations(db, batch.locations)
+    except IntegrityError:
+        raise await _unknown_assets_error(db, (loc.asset_id for loc in batch.locations))
+    return LocationBatchResponse(inserted=len(locations), locations=locations)
 
-    if result:
-        db_location.longitude, db_location.latitude = result
-    else:
-        raise HTTPException(status_code=500, detail="Failed to fetch location data")
-    return db_location
+@router.post("/{asset_id}", response_model=LocationResponse)
+async def post_location_update(asset_id: int,location: LocationCreate,db: AsyncSession = Depends(get_async_db),current_user: Principal = Depends(get_current_user)):
+    try:
+        return await ingest_location(db, asset_id=asset_id, location=location)
+    except IntegrityError:
+        raise await _unknown_assets_error(db, [asset_id])
 
 @router.get("/{asset_id}", response_model=LocationResponse)
-def get_latest_location(asset_id: int,db: Session = Depends(get_db),current_user: User = Depends(get_current_user)):
-    location = get_latest_asset_location(db, asset_id=asset_id)
+async def get_latest_location(asset_id: int,db: AsyncSession = Depends(get_async_db),current_user: Principal = Depends(get_current_user)):
+    location = await get_latest_asset_location(db, asset_id=asset_id)
     if not location:
         raise HTTPException(status_code=404, detail="No location data found for this asset")
     return location
 
-@router.get("/{asset_id}/history", response_model=list[LocationResponse])
-def get_location_history(
+@router.get("/{asset_id}/history", response_model=LocationPage)
+async def get_location_history(
     asset_id: int,
     start_time: Optional[datetime] = Query(None, description="Start time for history range"),
     end_time: Optional[datetime] = Query(None, description="End time for history range"),
-    limit: Optional[int] = Query(100, description="Limit number of results"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    limit: int = Query(100, ge=1, le=5000, description="Limit number of results"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    max_points: Optional[int] = Query(None, ge=2, le=5000, description="Downsample the page to at most this many points"),
+    tolerance: Optional[float] = Query(None, gt=0, description="Downsampling tolerance in meters"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    return get_asset_location_history(
+    before = decode_cursor(cursor, "ts", "id")
+    downsample = max_points is not None or tolerance is not None
+    if downsample:
+        # Simplify over the whole range (up to a hard cap) rather than one
+        # page, so the shape does not depend on where pages break.
+        limit = DOWNSAMPLE_SOURCE_LIMIT
+    locations = await get_asset_location_history(
         db,
         asset_id=asset_id,
         start_time=start_time,
         end_time=end_time,
-        limit=limit
-    )
\ No newline at end of file
+        limit=limit + 1,
+        before=(before["ts"], before["id"]) if before else None
+    )
+
+    next_cursor = None
+    if len(locations) > limit:
+        locations = locations[:limit]
+        last = locations[-1]
+        next_cursor = encode_cursor({"ts": last.timestamp, "id": last.id})
+    if downsample:
+        # CPU-bound on up to DOWNSAMPLE_SOURCE_LIMIT points; keep it off the event loop.
+        locations = await run_in_threadpool(downsample_locations, locations, max_points=max_points, tolerance_m=tolerance)
+    return LocationPage(items=locations, next_cursor=next_cursor)
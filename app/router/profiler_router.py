@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Optional
+from app.schemas.user_schema import Principal
+from app.auth import get_current_admin_user
+from app.services.profiler import PROFILER_ENABLED, REPEAT_THRESHOLD, SLOW_MS, query_profiler
+
+router = APIRouter(prefix="/profiler", tags=["profiler"])
+
+@router.get("/profiles")
+async def list_profiles(
+    kind: Optional[str] = Query(None, pattern="^(request|job)$"),
+    flagged_only: bool = Query(False, description="Only slow profiles or ones with repeated statement shapes"),
+    limit: int = Query(50, ge=1, le=500),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    return {
+        "enabled": PROFILER_ENABLED,
+        "repeat_threshold": REPEAT_THRESHOLD,
+        "slow_ms": SLOW_MS,
+        "profiles": query_profiler.profiles(kind, flagged_only, limit),
+    }
+
+@router.get("/statements")
+async def statement_summary(limit: int = Query(25, ge=1, le=500), current_user: Principal = Depends(get_current_admin_user)):
+    return {"enabled": PROFILER_ENABLED, "statements": query_profiler.summary(limit)}
+
+@router.delete("/profiles")
+async def clear_profiles(current_user: Principal = Depends(get_current_admin_user)):
+    query_profiler.clear()
+    return {"cleared": True}
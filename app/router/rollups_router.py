@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime
+from async_database import get_async_db
+from app.schemas.user_schema import Principal
+from app.auth import get_current_admin_user, get_current_user
+from app.schemas.rollups_schema import Granularity, MovementRollupResponse, FleetRollupResponse
+from app.crud.assets_crud import get_asset
+from app.crud.rollups_crud import get_asset_rollups, get_fleet_rollups, rebuild_asset_rollups
+
+router = APIRouter(prefix="/rollups", tags=["rollups"])
+
+@router.get("/fleet", response_model=FleetRollupResponse)
+async def fleet_rollups(
+    start_time: datetime = Query(..., description="Buckets starting at or after this time"),
+    end_time: datetime = Query(..., description="Buckets starting before this time"),
+    granularity: Granularity = Query(Granularity.day),
+    asset_type: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    if end_time <= start_time:
+        raise HTTPException(status_code=400, detail="end_time must be after start_time")
+    assets = await get_fleet_rollups(db, granularity.value, start_time, end_time, asset_type)
+    return FleetRollupResponse(granularity=granularity, start_time=start_time, end_time=end_time, assets=assets)
+
+@router.get("/{asset_id}", response_model=List[MovementRollupResponse])
+async def asset_rollups(
+    asset_id: int,
+    granularity: Granularity = Query(Granularity.hour),
+    start_time: Optional[datetime] = Query(None, description="Buckets starting at or after this time"),
+    end_time: Optional[datetime] = Query(None, description="Buckets starting before this time"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    return await get_asset_rollups(db, asset_id, granularity.value, start_time, end_time)
+
+@router.post("/{asset_id}/rebuild")
+async def rebuild_rollups(asset_id: int, db: AsyncSession = Depends(get_async_db), current_user: Principal = Depends(get_current_admin_user)):
+    if not await get_asset(db, asset_id):
+        raise HTTPException(status_code=404, detail="Asset not found")
+    points = await rebuild_asset_rollups(db, asset_id)
+    return {"asset_id": asset_id, "points": points}
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from async_database import get_async_db
+from app.schemas.user_schema import Principal
+from app.schemas.tasks_schema import TaskRunResponse
+from app.auth import get_current_admin_user
+from app.crud.tasks_crud import get_task_runs
+
+router = APIRouter(prefix="/tasks", tags=["tasks"])
+
+@router.get("/runs", response_model=List[TaskRunResponse])
+async def list_task_runs(
+    name: Optional[str] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_admin_user)
+):
+    return await get_task_runs(db, name, limit)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class AssetBase(BaseModel):
     name: str
@@ -24,4 +24,8 @@ class AssetResponse(AssetBase):
     id: int
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class AssetPage(BaseModel):
+    items: List[AssetResponse]
+    next_cursor: Optional[str] = None
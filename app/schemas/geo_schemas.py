@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 from datetime import datetime
 
 class GeoZoneBase(BaseModel):
@@ -10,20 +10,57 @@ class GeoZoneCreate(GeoZoneBase):
     asset_id: int
 
 class GeoZoneResponse(GeoZoneBase):
+    # Imported GeoJSON features need not carry a name.
+    name: Optional[str] = None
     id: int
     asset_id: int
     created_at: datetime
     class Config:
         from_attributes = True
 
+class GeoJSONPolygon(BaseModel):
+    type: Literal["Polygon"]
+    coordinates: List[List[List[float]]] = Field(..., min_length=1)
+
+class ZoneFeature(BaseModel):
+    type: Literal["Feature"]
+    geometry: GeoJSONPolygon
+    # GeoJSON allows "properties": null.
+    properties: Optional[dict] = None
+
+class ZoneFeatureCollection(BaseModel):
+    type: Literal["FeatureCollection"]
+    features: List[ZoneFeature] = Field(..., min_length=1, max_length=10000)
+
+class GeoZoneImportResponse(BaseModel):
+    inserted: int
+    zones: List[GeoZoneResponse]
+
 class GeoAlertResponse(BaseModel):
     id: int
     asset_id: int
     alert_type: str
     message: str
-    latitude: float
-    longitude: float
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     triggered_at: datetime
     resolved: bool
+    last_seen_at: Optional[datetime] = None
+    occurrences: int = 1
+    resolved_at: Optional[datetime] = None
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class GeoAlertPage(BaseModel):
+    items: List[GeoAlertResponse]
+    next_cursor: Optional[str] = None
+
+class NearbyAssetResponse(BaseModel):
+    asset_id: int
+    name: str
+    asset_type: str
+    status: Optional[str] = None
+    longitude: float
+    latitude: float
+    timestamp: datetime
+    distance_m: Optional[float] = None
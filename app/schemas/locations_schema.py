@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class LocationBase(BaseModel):
     latitude: float = Field(..., ge=-90, le=90)
@@ -17,4 +17,19 @@ class LocationResponse(LocationBase):
     timestamp: datetime
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class LocationBatchItem(LocationBase):
+    asset_id: int
+
+class LocationBatchCreate(BaseModel):
+    locations: List[LocationBatchItem] = Field(..., min_length=1, max_length=5000)
+
+class LocationBatchResponse(BaseModel):
+    inserted: int
+    locations: List[LocationResponse]
+
+
+class LocationPage(BaseModel):
+    items: List[LocationResponse]
+    next_cursor: Optional[str] = None
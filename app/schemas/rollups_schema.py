@@ -0,0 +1,45 @@
+from enum import Enum
+from pydantic import BaseModel, computed_field
+from datetime import datetime
+from typing import List, Optional
+
+class Granularity(str, Enum):
+    hour = "hour"
+    day = "day"
+
+class MovementSummary(BaseModel):
+    asset_id: int
+    point_count: int
+    distance_m: float
+    moving_distance_m: float
+    max_speed_mps: float
+    moving_seconds: float
+    idle_seconds: float
+    min_longitude: float
+    min_latitude: float
+    max_longitude: float
+    max_latitude: float
+    first_timestamp: datetime
+    last_timestamp: datetime
+
+    @computed_field
+    @property
+    def avg_speed_mps(self) -> Optional[float]:
+        # Average while moving: idle drift and segments past the gap limit
+        # add distance but no moving time, so they are left out of both.
+        if self.moving_seconds <= 0:
+            return None
+        return self.moving_distance_m / self.moving_seconds
+
+    class Config:
+        from_attributes = True
+
+class MovementRollupResponse(MovementSummary):
+    granularity: Granularity
+    bucket_start: datetime
+
+class FleetRollupResponse(BaseModel):
+    granularity: Granularity
+    start_time: datetime
+    end_time: datetime
+    assets: List[MovementSummary]
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+class TaskRunResponse(BaseModel):
+    id: int
+    name: str
+    shard: int
+    shard_count: int
+    slot: datetime
+    worker: str
+    status: str
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    assets_processed: Optional[int] = None
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field, EmailStr
 from typing import Optional
 from enum import Enum
+from app.models import users_model
 
 class Role(str, Enum):
     admin = "admin"
@@ -28,4 +29,18 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
-    role: Optional[str] = None
\ No newline at end of file
+    role: Optional[str] = None
+
+class Principal(BaseModel):
+    id: int
+    username: str
+    role: users_model.Role
+    disabled: bool = False
+
+    class Config:
+        from_attributes = True
+
+class UserAdminUpdate(BaseModel):
+    role: Optional[Role] = None
+    disabled: Optional[bool] = None
+    password: Optional[str] = Field(None, min_length=1)
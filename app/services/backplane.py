@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+from typing import Callable, List, Optional
+import asyncpg
+from async_database import get_async_db_url
+
+Deliver = Callable[[List[dict]], None]
+
+# NOTIFY payloads must stay under 8000 bytes; leave room for framing.
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+
+class InMemoryBackplane:
+    # Single-process stand-in: every hub attached to the same instance sees
+    # every publish, which is enough to exercise multi-worker fan-out in tests.
+    def __init__(self):
+        self.subscribers: List[Deliver] = []
+
+    async def start(self, deliver: Deliver):
+        self.subscribers.append(deliver)
+
+    async def stop(self):
+        self.subscribers.clear()
+
+    async def publish(self, messages: List[dict]):
+        for deliver in list(self.subscribers):
+            deliver(messages)
+
+
+def pack_notifications(messages: List[dict], limit: int = NOTIFY_PAYLOAD_LIMIT) -> List[str]:
+    # Packs as many messages per NOTIFY as fit under the payload limit. A
+    # message too large on its own is sent without additional_data.
+    payloads = []
+    batch: List[str] = []
+    # "[" + "]" plus one "," per message after the first.
+    size = 1
+    for message in messages:
+        encoded = json.dumps(message, separators=(",", ":"), default=str)
+        if len(encoded.encode()) + 2 > limit:
+            encoded = json.dumps({**message, "additional_data": None}, separators=(",", ":"), default=str)
+        encoded_size = len(encoded.encode()) + 1
+        if batch and size + encoded_size > limit:
+            payloads.append("[" + ",".join(batch) + "]")
+            batch, size = [], 1
+        batch.append(encoded)
+        size += encoded_size
+    if batch:
+        payloads.append("[" + ",".join(batch) + "]")
+    return payloads
+
+
+class PostgresBackplane:
+    # One LISTEN connection and one publishing connection per worker. Each
+    # batch of locations is NOTIFYed once; PostgreSQL delivers it to every
+    # listening worker, and each hub keeps only what its own viewers follow.
+    def __init__(self, dsn: str, channel: str = "asset_locations", reconnect_seconds: float = 2.0):
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_seconds = reconnect_seconds
+        self.deliver: Optional[Deliver] = None
+        self.listen_conn: Optional[asyncpg.Connection] = None
+        self.publish_conn: Optional[asyncpg.Connection] = None
+        self._publish_lock = asyncio.Lock()
+        self._supervisor: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver):
+        self.deliver = deliver
+        self._supervisor = asyncio.create_task(self._listen_forever())
+
+    async def stop(self):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            try:
+                await self._supervisor
+            except asyncio.CancelledError:
+                pass
+            self._supervisor = None
+        for conn in (self.listen_conn, self.publish_conn):
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+        self.listen_conn = self.publish_conn = None
+
+    def _on_notification(self, conn, pid, channel, payload):
+        try:
+            messages = json.loads(payload)
+        except ValueError as e:
+            print(f"Dropping malformed tracking notification: {e}")
+            return
+        self.deliver(messages)
+
+    async def _listen_forever(self):
+        while True:
+            try:
+                self.listen_conn = await asyncpg.connect(self.dsn)
+                await self.listen_conn.add_listener(self.channel, self._on_notification)
+                closed = asyncio.get_running_loop().create_future()
+                self.listen_conn.add_termination_listener(
+                    lambda conn: closed.done() or closed.set_result(None)
+                )
+                await closed
+                print("Tracking backplane listener disconnected, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Tracking backplane listener error: {e}")
+            await asyncio.sleep(self.reconnect_seconds)
+
+    async def publish(self, messages: List[dict]):
+        payloads = pack_notifications(messages)
+        async with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self.publish_conn is None or self.publish_conn.is_closed():
+                        self.publish_conn = await asyncpg.connect(self.dsn)
+                    await self.publish_conn.executemany(
+                        "SELECT pg_notify($1, $2)",
+                        [(self.channel, payload) for payload in payloads],
+                    )
+                    return
+                except (OSError, asyncpg.PostgresConnectionError, asyncpg.InterfaceError) as e:
+                    self.publish_conn = None
+                    if attempt:
+                        print(f"Error publishing tracking update: {e}")
+
+
+def get_asyncpg_dsn() -> str:
+    return get_async_db_url().replace("postgresql+asyncpg://", "postgresql://", 1)
+
+
+def build_backplane():
+    kind = os.getenv("TRACKING_BACKPLANE", "postgres")
+    if kind == "memory":
+        return InMemoryBackplane()
+    if kind == "postgres":
+        return PostgresBackplane(get_asyncpg_dsn(), channel=os.getenv("TRACKING_CHANNEL", "asset_locations"))
+    raise ValueError("TRACKING_BACKPLANE must be 'postgres' or 'memory'")
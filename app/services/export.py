@@ -1,89 +1,240 @@
-import pandas as pd
-from sqlalchemy import create_engine
+import csv
+import gzip
+import io
+import re
+import shutil
+import threading
+import zipfile
+import zlib
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import create_engine, text
 from pathlib import Path
 from datetime import datetime
 import os
-from typing import Dict
+from typing import Dict, Iterator, List, Optional
+
+EXPORT_QUERIES = {
+    # Never export password hashes.
+    "users": "SELECT id, username, email, role, disabled FROM users",
+    "assets": "SELECT * FROM assets",
+    "locations": (
+        "SELECT id, asset_id, ST_X(location) as longitude, "
+        "ST_Y(location) as latitude, timestamp, additional_data "
+        "FROM asset_locations"
+    ),
+}
+
+PARQUET_TYPES = {
+    "float64": pa.float64(),
+    "int64": pa.int64(),
+    "bool": pa.bool_(),
+    "string": pa.string(),
+}
+
+PARQUET_LOCATION_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("asset_id", pa.int64()),
+    ("timestamp", pa.timestamp("us", tz="UTC")),
+    ("date", pa.date32()),
+    ("longitude", pa.float64()),
+    ("latitude", pa.float64()),
+    ("additional_data", pa.string()),
+])
+
+def _coerce(value, type_name: str):
+    if value is None:
+        return None
+    try:
+        if type_name == "float64":
+            return float(value)
+        if type_name == "int64":
+            number = int(float(value))
+            return number if -2**63 <= number < 2**63 else None
+        if type_name == "bool":
+            return value.lower() in ("true", "1", "yes")
+    except (ValueError, OverflowError):
+        return None
+    return value
+
+def flattened_column(key: str) -> str:
+    return "data_" + re.sub(r"\W", "_", key)
+
+def duplicate_flattened_columns(keys) -> List[str]:
+    # Keys such as "a-b" and "a.b" both flatten to data_a_b.
+    columns: Dict[str, List[str]] = {}
+    for key in keys:
+        columns.setdefault(flattened_column(key), []).append(key)
+    return sorted(key for group in columns.values() if len(group) > 1 for key in group)
+
+class ExportCancelled(Exception):
+    pass
+
+class ExportProgress:
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+        self.estimated_rows: Optional[int] = None
+        self.cancelled = threading.Event()
+
+    def advance(self, rows: int, nbytes: int = 0):
+        if self.cancelled.is_set():
+            raise ExportCancelled()
+        self.rows += rows
+        self.bytes += nbytes
+
+    def update(self, data: bytes):
+        # Counts CSV lines (header included), which is close enough for
+        # progress reporting.
+        self.advance(data.count(b"\n"), len(data))
+
+class _ProgressWriter:
+    def __init__(self, fileobj, progress: ExportProgress):
+        self.fileobj = fileobj
+        self.progress = progress
+
+    def write(self, data):
+        self.progress.update(data)
+        return self.fileobj.write(data)
 
 class FullDataExporter:
     def __init__(self, db_url: str, export_dir: Path):
         self.engine = create_engine(db_url)
         self.export_dir = export_dir
         os.makedirs(self.export_dir, exist_ok=True)
-    
-    def export_all_data(self) -> Dict[str, str]:
+
+    def _csv_path(self, directory: Path, stem: str, compress: bool) -> Path:
+        return directory / (f"{stem}.csv.gz" if compress else f"{stem}.csv")
+
+    def estimate_rows(self, tables) -> int:
+        # Planner statistics, summed over partitions; no table scan.
+        with self.engine.connect() as conn:
+            return int(conn.execute(text("""
+                SELECT COALESCE(SUM(GREATEST(c.reltuples, 0)), 0)
+                FROM pg_class c
+                WHERE c.relkind = 'r'
+                AND (c.relname = ANY(:tables) OR c.oid IN (
+                    SELECT i.inhrelid FROM pg_inherits i
+                    JOIN pg_class p ON p.oid = i.inhparent
+                    WHERE p.relname = ANY(:tables)
+                ))
+            """), {"tables": list(tables)}).scalar())
+
+    def copy_query_to_file(self, query: str, params: Optional[dict], filepath: Path, compress: bool = False, progress: Optional[ExportProgress] = None):
+        # COPY streams rows from the server straight into the file, so memory
+        # use does not depend on the size of the result.
+        conn = self.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            sql = cursor.mogrify(query, params).decode()
+            opener = gzip.open if compress else open
+            with opener(filepath, "wb") as f:
+                target = _ProgressWriter(f, progress) if progress else f
+                cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", target)
+            cursor.close()
+            conn.commit()
+        except Exception:
+            filepath.unlink(missing_ok=True)
+            raise
+        finally:
+            conn.close()
+
+    def stream_query_csv(self, query: str, params: Optional[dict] = None, compress: bool = False, chunk_rows: int = 10000) -> Iterator[bytes]:
+        # Named (server-side) cursor: rows arrive `chunk_rows` at a time and
+        # each chunk is encoded and yielded before the next one is fetched.
+        compressor = zlib.compressobj(wbits=31) if compress else None
+        conn = self.engine.raw_connection()
+        try:
+            cursor = conn.cursor(name=f"export_{datetime.now().strftime('%H%M%S%f')}")
+            cursor.itersize = chunk_rows
+            cursor.execute(query, params)
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            header_written = False
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not header_written:
+                    writer.writerow([col.name for col in cursor.description])
+                    header_written = True
+                if not rows:
+                    break
+                writer.writerows(rows)
+                chunk = buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+                yield compressor.compress(chunk) if compressor else chunk
+
+            tail = buffer.getvalue().encode()
+            if compressor:
+                tail = compressor.compress(tail) + compressor.flush()
+            if tail:
+                yield tail
+            cursor.close()
+            conn.commit()
+        finally:
+            conn.close()
+
+    def export_all_data(self, compress: bool = False, progress: Optional[ExportProgress] = None) -> Dict[str, str]:
         full_dir = self.export_dir / "full"
         full_dir.mkdir(exist_ok=True)
-        
-        for f in full_dir.glob("*.csv"):
+
+        for f in full_dir.glob("*.csv*"):
             f.unlink()
-        
+
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         exports = {}
-        
+        if progress:
+            progress.estimated_rows = self.estimate_rows(["users", "assets", "asset_locations"])
+
         try:
-            users_df = pd.read_sql_table("users", self.engine)
-            users_path = full_dir / f"users_{timestamp}.csv"
-            users_df.to_csv(users_path, index=False)
-            exports['users'] = users_path.relative_to(self.export_dir)
-            
-            assets_df = pd.read_sql_table("assets", self.engine)
-            assets_path = full_dir / f"assets_{timestamp}.csv"
-            assets_df.to_csv(assets_path, index=False)
-            exports['assets'] = assets_path.relative_to(self.export_dir)
-            
-            loc_df = pd.read_sql_query(
-                "SELECT id, asset_id, ST_X(location) as longitude, "
-                "ST_Y(location) as latitude, timestamp, additional_data "
-                "FROM asset_locations", self.engine
-            )
-            loc_path = full_dir / f"locations_{timestamp}.csv"
-            loc_df.to_csv(loc_path, index=False)
-            exports['locations'] = loc_path.relative_to(self.export_dir)
-            
+            for name, query in EXPORT_QUERIES.items():
+                path = self._csv_path(full_dir, f"{name}_{timestamp}", compress)
+                self.copy_query_to_file(query, None, path, compress, progress)
+                exports[name] = path.relative_to(self.export_dir)
+
             return exports
         except Exception as e:
             for path in exports.values():
                 (self.export_dir / path).unlink(missing_ok=True)
             raise
-    
-    def export_asset_data(self, asset_id: int) -> str:
+
+    def export_asset_data(self, asset_id: int, compress: bool = False, progress: Optional[ExportProgress] = None) -> str:
         asset_dir = self.export_dir / "assets" / str(asset_id)
         asset_dir.mkdir(parents=True, exist_ok=True)
-        
-        for f in asset_dir.glob("*.csv"):
+
+        for f in asset_dir.glob("*.csv*"):
             f.unlink()
-        
+
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filepath = asset_dir / f"asset_{asset_id}_{timestamp}.csv"
-        
-        query = f"""
-            SELECT a.id, a.name, 
-                   ST_X(al.location) as longitude, 
+        filepath = self._csv_path(asset_dir, f"asset_{asset_id}_{timestamp}", compress)
+
+        query = """
+            SELECT a.id, a.name,
+                   ST_X(al.location) as longitude,
                    ST_Y(al.location) as latitude,
                    al.timestamp, al.additional_data
             FROM assets a
             LEFT JOIN asset_locations al ON a.id = al.asset_id
-            WHERE a.id = {asset_id}
+            WHERE a.id = %(asset_id)s
             ORDER BY al.timestamp DESC
         """
-        df = pd.read_sql_query(query, self.engine)
-        df.to_csv(filepath, index=False)
-        
+        self.copy_query_to_file(query, {"asset_id": asset_id}, filepath, compress, progress)
+
         return filepath.relative_to(self.export_dir)
 
-    def export_asset_data_all(self, asset_id: int) -> Path:
+    def export_asset_data_all(self, asset_id: int, compress: bool = False, progress: Optional[ExportProgress] = None) -> Path:
         asset_dir = self.export_dir / "assets_all" / str(asset_id)
         asset_dir.mkdir(parents=True, exist_ok=True)
-        
-        for f in asset_dir.glob("*.csv"):
+
+        for f in asset_dir.glob("*.csv*"):
             f.unlink()
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filepath = asset_dir / f"asset_{asset_id}combined{timestamp}.csv"
+        filepath = self._csv_path(asset_dir, f"asset_{asset_id}combined{timestamp}", compress)
 
-        query = f"""
-            SELECT 
+        query = """
+            SELECT
                 'location' AS record_type,
                 al.id AS record_id,
                 ST_X(al.location) AS longitude,
@@ -94,28 +245,115 @@ class FullDataExporter:
                 NULL AS message,
                 NULL AS resolution_status
             FROM asset_locations al
-            WHERE al.asset_id = {asset_id}
+            WHERE al.asset_id = %(asset_id)s
 
             UNION ALL
 
-            SELECT 
+            SELECT
                 'alert' AS record_type,
                 ga.id AS record_id,
-                ST_X(ST_Centroid(gz.zone)) AS longitude,  -- Get zone center
-                ST_Y(ST_Centroid(gz.zone)) AS latitude,
+                ga.longitude,
+                ga.latitude,
                 ga.triggered_at AS timestamp,
                 NULL AS additional_data,
                 ga.alert_type,
                 ga.message,
                 ga.resolved AS resolution_status
             FROM geo_alerts ga
-            JOIN geo_zones gz ON ga.asset_id = gz.asset_id
-            WHERE ga.asset_id = {asset_id}
+            WHERE ga.asset_id = %(asset_id)s
 
             ORDER BY timestamp DESC
         """
 
-        df = pd.read_sql_query(query, self.engine)
-        df.to_csv(filepath, index=False)
-        
-        return filepath
\ No newline at end of file
+        self.copy_query_to_file(query, {"asset_id": asset_id}, filepath, compress, progress)
+
+        return filepath
+
+    def export_locations_parquet(self, flatten: Optional[Dict[str, str]] = None, asset_id: Optional[int] = None, progress: Optional[ExportProgress] = None, chunk_rows: int = 100_000) -> Path:
+        # Hive-partitioned dataset (asset_id=<id>/date=<yyyy-mm-dd>/*.parquet)
+        # with typed coordinates and selected additional_data keys pulled out
+        # into their own typed columns, zipped for download.
+        flatten = flatten or {}
+        for type_name in flatten.values():
+            if type_name not in PARQUET_TYPES:
+                raise ValueError(f"Unsupported column type {type_name}, expected one of {sorted(PARQUET_TYPES)}")
+        duplicates = duplicate_flattened_columns(flatten)
+        if duplicates:
+            raise ValueError(f"additional_data keys {duplicates} flatten to the same column name")
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        parquet_dir = self.export_dir / "parquet"
+        out_dir = parquet_dir / f"locations_{timestamp}"
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        schema = PARQUET_LOCATION_SCHEMA
+        extra_columns = []
+        params = {}
+        for i, (key, type_name) in enumerate(flatten.items()):
+            column = flattened_column(key)
+            schema = schema.append(pa.field(column, PARQUET_TYPES[type_name]))
+            extra_columns.append(f", additional_data->>%(key_{i})s AS {column}")
+            params[f"key_{i}"] = key
+
+        where = ""
+        if asset_id is not None:
+            where = "WHERE asset_id = %(asset_id)s"
+            params["asset_id"] = asset_id
+
+        query = f"""
+            SELECT id, asset_id, timestamp, (timestamp AT TIME ZONE 'UTC')::date AS date,
+                   ST_X(location) AS longitude, ST_Y(location) AS latitude,
+                   additional_data::text AS additional_data
+                   {"".join(extra_columns)}
+            FROM asset_locations
+            {where}
+            ORDER BY asset_id, timestamp
+        """
+        if progress and asset_id is None:
+            progress.estimated_rows = self.estimate_rows(["asset_locations"])
+
+        conn = self.engine.raw_connection()
+        try:
+            cursor = conn.cursor(name=f"parquet_{datetime.now().strftime('%H%M%S%f')}")
+            cursor.itersize = chunk_rows
+            cursor.execute(query, params)
+
+            chunk_index = 0
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                columns = list(zip(*rows))
+                arrays = []
+                for i, field in enumerate(schema):
+                    values = columns[i]
+                    if i >= len(PARQUET_LOCATION_SCHEMA):
+                        type_name = list(flatten.values())[i - len(PARQUET_LOCATION_SCHEMA)]
+                        values = [_coerce(v, type_name) for v in values]
+                    arrays.append(pa.array(values, type=field.type))
+                table = pa.Table.from_arrays(arrays, schema=schema)
+
+                pq.write_to_dataset(
+                    table,
+                    root_path=out_dir,
+                    partition_cols=["asset_id", "date"],
+                    compression="zstd",
+                    use_dictionary=True,
+                    basename_template=f"part-{chunk_index}-{{i}}.parquet",
+                    existing_data_behavior="overwrite_or_ignore",
+                )
+                chunk_index += 1
+                if progress:
+                    progress.advance(len(rows), table.nbytes)
+            cursor.close()
+            conn.commit()
+
+            # Parquet pages are already compressed; store them as-is.
+            archive = out_dir.with_suffix(".zip")
+            with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_STORED) as zf:
+                for path in sorted(out_dir.rglob("*.parquet")):
+                    zf.write(path, path.relative_to(out_dir))
+            return archive
+        finally:
+            conn.close()
+            shutil.rmtree(out_dir, ignore_errors=True)
@@ -0,0 +1,277 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import select, text
+from sqlalchemy.engine import Engine
+from app.models.export_jobs_model import ExportJob
+from app.services.export import ExportCancelled, ExportProgress
+from app.services.metrics import EXPORT_JOB_DURATION
+
+
+class ExportQueueFull(Exception):
+    pass
+
+
+def eta_seconds(job: dict) -> Optional[float]:
+    estimated = job["estimated_rows"]
+    if job["status"] != "running" or not estimated or not job["started_at"]:
+        return None
+    elapsed = (datetime.now(timezone.utc) - job["started_at"]).total_seconds()
+    rows = job["rows_written"]
+    if rows <= 0 or elapsed <= 0:
+        return None
+    remaining = max(estimated - rows, 0)
+    return round(remaining / (rows / elapsed), 1)
+
+
+def job_to_dict(job: dict) -> dict:
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "params": job["params"],
+        "status": job["status"],
+        "error": job["error"],
+        "rows_written": job["rows_written"],
+        "bytes_written": job["bytes_written"],
+        "estimated_rows": job["estimated_rows"],
+        "eta_seconds": eta_seconds(job),
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "files": {
+            name: {"filename": path, "download_url": f"/export/download/{path}"}
+            for name, path in job["files"].items()
+        },
+    }
+
+
+# The part of a job only the process running it has: the live progress
+# counters and the executor future.
+class LocalExportJob:
+    def __init__(self, job_id: str, kind: str):
+        self.id = job_id
+        self.kind = kind
+        self.progress = ExportProgress()
+        self.future = None
+        self.started = time.monotonic()
+
+
+# Export jobs run on a small thread pool (COPY spends its time in libpq, off
+# the GIL) so request handlers only enqueue and return. Job state is kept in
+# the export_jobs table: submit() counts active jobs there under an advisory
+# lock, so `max_workers + max_queued` bounds the whole deployment, and a
+# monitor thread flushes local progress and picks up cancellations made
+# through other workers. Jobs whose worker stops heartbeating are failed.
+class ExportJobManager:
+    def __init__(
+        self,
+        engine: Engine,
+        export_dir: Path,
+        max_workers: int = 2,
+        max_queued: int = 8,
+        retention_seconds: int = 86400,
+        sync_seconds: float = 2.0,
+        worker_id: Optional[str] = None,
+    ):
+        self.engine = engine
+        self.export_dir = export_dir
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self.sync_seconds = sync_seconds
+        self.stale_seconds = max(60.0, sync_seconds * 10)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="export")
+        self.local: Dict[str, LocalExportJob] = {}
+        self._lock = threading.Lock()
+        self._monitor: Optional[threading.Thread] = None
+
+    def submit(self, kind: str, owner: str, params: dict, run: Callable[[ExportProgress], Dict[str, Path]]) -> dict:
+        self.purge_expired()
+        job_id = uuid.uuid4().hex
+        with self.engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('export_jobs'))"))
+            active = conn.execute(
+                text("SELECT count(*) FROM export_jobs WHERE status IN ('queued', 'running')")
+            ).scalar()
+            if active >= self.max_workers + self.max_queued:
+                raise ExportQueueFull()
+            job = conn.execute(
+                text("""
+                    INSERT INTO export_jobs (id, kind, owner, params, status, worker)
+                    VALUES (:id, :kind, :owner, CAST(:params AS jsonb), 'queued', :worker)
+                    RETURNING *
+                """),
+                {"id": job_id, "kind": kind, "owner": owner, "params": json.dumps(params), "worker": self.worker_id}
+            ).mappings().one()
+
+        local = LocalExportJob(job_id, kind)
+        with self._lock:
+            self.local[job_id] = local
+            local.future = self.executor.submit(self._run, local, run)
+        self._ensure_monitor()
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self.engine.connect() as conn:
+            job = conn.execute(
+                select(ExportJob.__table__).where(ExportJob.id == job_id)
+            ).mappings().first()
+        return dict(job) if job else None
+
+    def list(self, owner: Optional[str] = None) -> List[dict]:
+        query = select(ExportJob.__table__)
+        if owner is not None:
+            query = query.where(ExportJob.owner == owner)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query.order_by(ExportJob.created_at.desc())).mappings().all()
+        return [dict(row) for row in rows]
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("""
+                    UPDATE export_jobs SET cancel_requested = true
+                    WHERE id = :id AND status IN ('queued', 'running')
+                """),
+                {"id": job_id}
+            )
+        # If another worker holds the job its monitor picks this up.
+        self._cancel_local(job_id)
+        return self.get(job_id)
+
+    def purge_expired(self):
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("""
+                    UPDATE export_jobs
+                    SET status = 'failed', error = 'Export worker stopped responding', finished_at = now()
+                    WHERE status IN ('queued', 'running')
+                      AND heartbeat_at < now() - make_interval(secs => :stale)
+                """),
+                {"stale": self.stale_seconds}
+            )
+            expired = conn.execute(
+                text("""
+                    DELETE FROM export_jobs
+                    WHERE finished_at < now() - make_interval(secs => :retention)
+                    RETURNING files
+                """),
+                {"retention": self.retention_seconds}
+            ).scalars().all()
+        for files in expired:
+            for path in files.values():
+                (self.export_dir / path).unlink(missing_ok=True)
+
+    def _ensure_monitor(self):
+        with self._lock:
+            if self._monitor is None or not self._monitor.is_alive():
+                self._monitor = threading.Thread(target=self._monitor_forever, name="export-monitor", daemon=True)
+                self._monitor.start()
+
+    def _monitor_forever(self):
+        while True:
+            time.sleep(self.sync_seconds)
+            with self._lock:
+                held = list(self.local.values())
+            for local in held:
+                try:
+                    if self._heartbeat(local):
+                        self._cancel_local(local.id)
+                except Exception as e:
+                    print(f"Export job {local.id} heartbeat failed: {e}")
+
+    def _heartbeat(self, local: LocalExportJob) -> bool:
+        progress = local.progress
+        with self.engine.begin() as conn:
+            cancel_requested = conn.execute(
+                text("""
+                    UPDATE export_jobs
+                    SET rows_written = :rows, bytes_written = :bytes,
+                        estimated_rows = :estimated, heartbeat_at = now()
+                    WHERE id = :id AND status IN ('queued', 'running')
+                    RETURNING cancel_requested
+                """),
+                {"id": local.id, "rows": progress.rows, "bytes": progress.bytes, "estimated": progress.estimated_rows}
+            ).scalar()
+        return bool(cancel_requested)
+
+    def _cancel_local(self, job_id: str):
+        with self._lock:
+            local = self.local.get(job_id)
+        if local is None:
+            return
+        local.progress.cancelled.set()
+        if local.future.cancel():
+            self._finish(local, "cancelled")
+
+    def _finish(self, local: LocalExportJob, status: str, error: Optional[str] = None, files: Optional[Dict[str, str]] = None):
+        progress = local.progress
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(
+                    text("""
+                        UPDATE export_jobs
+                        SET status = :status, error = :error, files = CAST(:files AS jsonb),
+                            rows_written = :rows, bytes_written = :bytes, estimated_rows = :estimated,
+                            finished_at = now(), heartbeat_at = now()
+                        WHERE id = :id
+                    """),
+                    {
+                        "id": local.id, "status": status, "error": error, "files": json.dumps(files or {}),
+                        "rows": progress.rows, "bytes": progress.bytes, "estimated": progress.estimated_rows,
+                    }
+                )
+        finally:
+            with self._lock:
+                self.local.pop(local.id, None)
+            EXPORT_JOB_DURATION.labels(local.kind, status).observe(time.monotonic() - local.started)
+
+    def _relative(self, path) -> str:
+        path = Path(path)
+        if not path.is_absolute():
+            path = self.export_dir / path
+        return str(path.resolve().relative_to(self.export_dir.resolve()))
+
+    def _run(self, local: LocalExportJob, run: Callable[[ExportProgress], Dict[str, Path]]):
+        with self.engine.begin() as conn:
+            started = conn.execute(
+                text("""
+                    UPDATE export_jobs SET status = 'running', started_at = now(), heartbeat_at = now()
+                    WHERE id = :id AND status = 'queued' AND NOT cancel_requested
+                    RETURNING id
+                """),
+                {"id": local.id}
+            ).scalar()
+        if started is None or local.progress.cancelled.is_set():
+            self._finish(local, "cancelled")
+            return
+
+        local.started = time.monotonic()
+        status, error, files = "succeeded", None, {}
+        try:
+            files = {name: self._relative(path) for name, path in run(local.progress).items()}
+        except ExportCancelled:
+            status = "cancelled"
+        except Exception as e:
+            status, error = "failed", str(e)
+            print(f"Export job {local.id} failed: {e}")
+        finally:
+            self._finish(local, status, error, files)
+
+
+def build_export_job_manager(engine: Engine, export_dir: Path) -> ExportJobManager:
+    return ExportJobManager(
+        engine,
+        export_dir,
+        max_workers=int(os.getenv("EXPORT_MAX_WORKERS", "2")),
+        max_queued=int(os.getenv("EXPORT_MAX_QUEUED", "8")),
+        sync_seconds=float(os.getenv("EXPORT_JOB_SYNC_SECONDS", "2")),
+    )
@@ -0,0 +1,27 @@
+from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.locations_schema import LocationCreate, LocationResponse, LocationBatchItem
+from app.crud.locations_crud import insert_asset_locations, upsert_last_positions
+from app.crud.rollups_crud import lock_previous_positions, update_movement_rollups
+from app.crud.geo_crud import check_geofences_on_ingest, resolve_alerts
+from app.services.position_cache import last_position_cache
+from app.services.tracking import hub
+
+async def ingest_locations(db: AsyncSession, locations: List[LocationBatchItem]) -> List[LocationResponse]:
+    created = await insert_asset_locations(db, locations)
+    asset_ids = sorted({loc.asset_id for loc in created})
+
+    previous = await lock_previous_positions(db, asset_ids)
+    await update_movement_rollups(db, created, previous)
+    await upsert_last_positions(db, created)
+    await check_geofences_on_ingest(db, asset_ids)
+    await resolve_alerts(db, asset_ids, "stale_data")
+    await db.commit()
+
+    last_position_cache.invalidate(asset_ids)
+    hub.publish(created)
+    return created
+
+async def ingest_location(db: AsyncSession, asset_id: int, location: LocationCreate) -> LocationResponse:
+    item = LocationBatchItem(asset_id=asset_id, **location.model_dump())
+    return (await ingest_locations(db, [item]))[0]
@@ -0,0 +1,151 @@
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.requests import Request
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+)
+
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed", ["engine"])
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement execution time",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+BROADCAST_SEND_LATENCY = Histogram(
+    "tracking_broadcast_send_seconds",
+    "Time to send one location update (or one batched frame) to one WebSocket",
+    buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+BROADCAST_DROPPED = Counter("tracking_broadcast_dropped_total", "Updates dropped because a viewer queue was full")
+
+JOB_DURATION = Histogram(
+    "background_job_duration_seconds",
+    "Background job run time",
+    ["job"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+JOB_FAILURES = Counter("background_job_failures_total", "Background job runs that raised", ["job"])
+JOB_ASSETS = Gauge("background_job_assets", "Assets affected by the last run of a background job", ["job"])
+
+EXPORT_JOB_DURATION = Histogram(
+    "export_job_duration_seconds",
+    "Export job run time",
+    ["kind", "status"],
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800, 3600),
+)
+
+# Per-asset subscriber counts are only exported for the busiest assets, to
+# keep label cardinality bounded on large fleets.
+TOP_SUBSCRIBED_ASSETS = int(os.getenv("METRICS_TOP_SUBSCRIBED_ASSETS", "20"))
+
+
+def instrument_engine(engine: Engine, name: str):
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERIES.labels(name).inc()
+        started = getattr(context, "_metrics_started", None)
+        if started is not None:
+            DB_QUERY_LATENCY.labels(name).observe(time.perf_counter() - started)
+
+    POOL_COLLECTOR.engines[name] = engine
+
+
+class PoolCollector:
+    def __init__(self):
+        self.engines: Dict[str, Engine] = {}
+
+    def collect(self):
+        checked_out = GaugeMetricFamily("db_pool_checked_out", "Connections currently checked out", labels=["engine"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "Connections open beyond pool_size", labels=["engine"])
+        size = GaugeMetricFamily("db_pool_size", "Configured pool size", labels=["engine"])
+        for name, engine in self.engines.items():
+            pool = engine.pool
+            if not hasattr(pool, "checkedout"):
+                continue
+            checked_out.add_metric([name], pool.checkedout())
+            overflow.add_metric([name], max(pool.overflow(), 0))
+            size.add_metric([name], pool.size())
+        yield checked_out
+        yield overflow
+        yield size
+
+
+class TrackingCollector:
+    def __init__(self, hub):
+        self.hub = hub
+
+    def collect(self):
+        subscriptions = list(self.hub.subscriptions.values())
+        connections = GaugeMetricFamily("tracking_websocket_connections", "Open tracking WebSockets")
+        connections.add_metric([], sum(len(s.websockets) for s in subscriptions))
+        assets = GaugeMetricFamily("tracking_subscribed_assets", "Assets with at least one viewer")
+        assets.add_metric([], len(subscriptions))
+        queued = GaugeMetricFamily("tracking_queued_messages", "Updates waiting to be sent to viewers")
+        queued.add_metric([], sum(s.queue.qsize() for s in subscriptions))
+        per_asset = GaugeMetricFamily(
+            "tracking_asset_subscribers",
+            "Viewers of the most-watched assets",
+            labels=["asset_id"],
+        )
+        busiest = sorted(subscriptions, key=lambda s: len(s.websockets), reverse=True)[:TOP_SUBSCRIBED_ASSETS]
+        for subscription in busiest:
+            per_asset.add_metric([str(subscription.asset_id)], len(subscription.websockets))
+        multiplexed = GaugeMetricFamily("tracking_multiplexed_clients", "Open multiplexed tracking WebSockets")
+        multiplexed.add_metric([], len(self.hub.clients.clients))
+        yield connections
+        yield multiplexed
+        yield assets
+        yield queued
+        yield per_asset
+
+
+POOL_COLLECTOR = PoolCollector()
+REGISTRY.register(POOL_COLLECTOR)
+
+
+def register_tracking_hub(hub):
+    REGISTRY.register(TrackingCollector(hub))
+
+
+@asynccontextmanager
+async def track_job(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        JOB_FAILURES.labels(name).inc()
+        raise
+    finally:
+        JOB_DURATION.labels(name).observe(time.perf_counter() - started)
+
+
+async def metrics_middleware(request: Request, call_next):
+    # Labelled by route template (/track/{asset_id}), not the raw path.
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            request.method,
+            getattr(route, "path", "unmatched"),
+            str(status),
+        ).observe(time.perf_counter() - started)
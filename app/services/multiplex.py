@@ -0,0 +1,226 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+import msgpack
+from fastapi import WebSocket
+from async_database import AsyncSessionLocal
+from app.crud.assets_crud import get_asset_ids_by_type
+from app.crud.geo_crud import find_assets_in_bbox
+from app.crud.locations_crud import get_last_positions
+from app.services.metrics import BROADCAST_SEND_LATENCY
+
+# Batched frames carry rows instead of objects: {"t": "loc", "d": [row, ...]}
+# with each row laid out as FRAME_FIELDS (timestamp in epoch milliseconds).
+FRAME_FIELDS = ["asset_id", "longitude", "latitude", "timestamp_ms"]
+MAX_ASSETS_PER_CLIENT = int(os.getenv("TRACKING_MAX_ASSETS_PER_CLIENT", "5000"))
+MIN_RATE, MAX_RATE = 0.2, 20.0
+
+BBox = Tuple[float, float, float, float]
+
+
+def _epoch_ms(value) -> int:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp() * 1000)
+
+
+def compact(message: dict) -> list:
+    return [
+        message["asset_id"],
+        round(message["longitude"], 6),
+        round(message["latitude"], 6),
+        _epoch_ms(message["timestamp"]),
+    ]
+
+
+def bbox_contains(bbox: BBox, longitude: float, latitude: float) -> bool:
+    min_lon, min_lat, max_lon, max_lat = bbox
+    if not min_lat <= latitude <= max_lat:
+        return False
+    if min_lon <= max_lon:
+        return min_lon <= longitude <= max_lon
+    # Crosses the antimeridian.
+    return longitude >= min_lon or longitude <= max_lon
+
+
+# One multiplexed socket. Updates are coalesced per asset in `pending` (only
+# the newest position survives) and flushed as one batched frame at most
+# `max_rate` times per second, so a busy fleet costs a viewer a few frames a
+# second rather than one message per point.
+class TrackingClient:
+    def __init__(self, websocket: WebSocket, encoding: str = "json", max_rate: float = 2.0):
+        self.websocket = websocket
+        self.encoding = encoding
+        self.max_rate = min(max(max_rate, MIN_RATE), MAX_RATE)
+        self.assets: Set[int] = set()
+        self.groups: Dict[str, Set[int]] = {}
+        self.bbox: Optional[BBox] = None
+        self.pending: Dict[int, list] = {}
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def interest(self) -> Set[int]:
+        interest = set(self.assets)
+        for asset_ids in self.groups.values():
+            interest |= asset_ids
+        return interest
+
+    def offer(self, row: list):
+        self.pending[row[0]] = row
+        self.wake.set()
+
+    async def send(self, frame: dict):
+        if self.encoding == "msgpack":
+            await self.websocket.send_bytes(msgpack.packb(frame))
+        else:
+            await self.websocket.send_text(json.dumps(frame, separators=(",", ":")))
+
+    async def receive(self) -> Optional[dict]:
+        message = await self.websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return None
+        if message.get("bytes") is not None:
+            return msgpack.unpackb(message["bytes"])
+        return json.loads(message.get("text") or "{}")
+
+    async def flush_forever(self):
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+            if not self.pending:
+                continue
+            rows, self.pending = list(self.pending.values()), {}
+            started = time.perf_counter()
+            await self.send({"t": "loc", "d": rows})
+            BROADCAST_SEND_LATENCY.observe(time.perf_counter() - started)
+            await asyncio.sleep(max(1 / self.max_rate - (time.perf_counter() - started), 0))
+
+
+class ClientRegistry:
+    def __init__(self):
+        self.clients: Set[TrackingClient] = set()
+        self.asset_clients: Dict[int, Set[TrackingClient]] = {}
+        self.bbox_clients: Set[TrackingClient] = set()
+
+    def add(self, client: TrackingClient):
+        self.clients.add(client)
+        client.task = asyncio.create_task(self._run(client))
+
+    def remove(self, client: TrackingClient):
+        if client not in self.clients:
+            return
+        self.clients.discard(client)
+        self._reindex(client, client.interest(), set())
+        self.bbox_clients.discard(client)
+        if client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    async def _run(self, client: TrackingClient):
+        try:
+            await client.flush_forever()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error sending tracking frame: {e}")
+            self.remove(client)
+
+    def _reindex(self, client: TrackingClient, before: Set[int], after: Set[int]):
+        for asset_id in before - after:
+            clients = self.asset_clients.get(asset_id)
+            if clients is not None:
+                clients.discard(client)
+                if not clients:
+                    del self.asset_clients[asset_id]
+        for asset_id in after - before:
+            self.asset_clients.setdefault(asset_id, set()).add(client)
+
+    def update(self, client: TrackingClient, assets: Set[int], groups: Dict[str, Set[int]], bbox: Optional[BBox]):
+        before = client.interest()
+        client.assets, client.groups, client.bbox = assets, groups, bbox
+        self._reindex(client, before, client.interest())
+        if bbox is None:
+            self.bbox_clients.discard(client)
+        else:
+            self.bbox_clients.add(client)
+
+    def wants(self, asset_id: int) -> bool:
+        return asset_id in self.asset_clients or bool(self.bbox_clients)
+
+    def dispatch(self, messages: List[dict]):
+        for message in messages:
+            targets = set(self.asset_clients.get(message["asset_id"], ()))
+            for client in self.bbox_clients:
+                if bbox_contains(client.bbox, message["longitude"], message["latitude"]):
+                    targets.add(client)
+            if not targets:
+                continue
+            row = compact(message)
+            for client in targets:
+                client.offer(row)
+
+
+def _parse_bbox(value) -> BBox:
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in value)
+    except (TypeError, ValueError):
+        raise ValueError("bbox must be [min_longitude, min_latitude, max_longitude, max_latitude]")
+    if not (-180 <= min_lon <= 180 and -180 <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox is out of range")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+async def apply_request(registry: ClientRegistry, client: TrackingClient, request: dict):
+    # {"op": "subscribe" | "unsubscribe", "assets": [ids], "groups": [asset_type],
+    #  "bbox": [min_lon, min_lat, max_lon, max_lat]}; a subscribed bbox replaces
+    # the previous one. {"op": "set_rate", "max_rate": n} changes the frame rate.
+    op = request.get("op")
+    if op == "set_rate":
+        client.max_rate = min(max(float(request.get("max_rate", client.max_rate)), MIN_RATE), MAX_RATE)
+        await client.send({"t": "ack", "op": op, "max_rate": client.max_rate})
+        return
+    if op not in ("subscribe", "unsubscribe"):
+        raise ValueError("op must be subscribe, unsubscribe or set_rate")
+
+    asset_ids = {int(a) for a in request.get("assets") or []}
+    group_names = {str(g) for g in request.get("groups") or []}
+    assets = set(client.assets)
+    groups = dict(client.groups)
+    bbox = client.bbox
+    snapshot_ids: Set[int] = set()
+    snapshot_rows: List[dict] = []
+
+    if op == "unsubscribe":
+        assets -= asset_ids
+        for name in group_names:
+            groups.pop(name, None)
+        if request.get("bbox") is not None:
+            bbox = None
+    else:
+        new_bbox = _parse_bbox(request["bbox"]) if request.get("bbox") is not None else None
+        async with AsyncSessionLocal() as db:
+            resolved = await get_asset_ids_by_type(db, group_names - set(groups), MAX_ASSETS_PER_CLIENT) if group_names else {}
+            groups.update({name: set(ids) for name, ids in resolved.items()})
+            snapshot_ids = (asset_ids - assets) | {a for ids in resolved.values() for a in ids}
+            assets |= asset_ids
+            if len(assets) + sum(len(ids) for ids in groups.values()) > MAX_ASSETS_PER_CLIENT:
+                raise ValueError(f"At most {MAX_ASSETS_PER_CLIENT} assets per connection")
+            snapshot_rows = await get_last_positions(db, sorted(snapshot_ids))
+            if new_bbox is not None:
+                bbox = new_bbox
+                snapshot_rows += await find_assets_in_bbox(db, *new_bbox, limit=MAX_ASSETS_PER_CLIENT)
+
+    registry.update(client, assets, groups, bbox)
+    await client.send({
+        "t": "ack",
+        "op": op,
+        "fields": FRAME_FIELDS,
+        "assets": len(client.interest()),
+        "groups": sorted(client.groups),
+        "bbox": list(client.bbox) if client.bbox else None,
+    })
+    # Current positions go out with the next frame, coalesced with live ones.
+    for row in snapshot_rows:
+        client.offer(compact(row))
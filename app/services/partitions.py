@@ -0,0 +1,148 @@
+import logging
+import os
+import re
+from datetime import date, datetime
+from typing import List, Optional
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+PARTITION_NAME = re.compile(r"_p(\d{4})(\d{2})$")
+
+logger = logging.getLogger(__name__)
+
+
+def _month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+class PartitionManager:
+    def __init__(
+        self,
+        engine: Engine,
+        table: str = "asset_locations",
+        months_ahead: int = 3,
+        retention_months: int = 0,
+        retention_mode: str = "detach",
+    ):
+        if retention_mode not in ("detach", "drop"):
+            raise ValueError("retention_mode must be 'detach' or 'drop'")
+        self.engine = engine
+        self.table = table
+        self.months_ahead = months_ahead
+        # 0 keeps history forever.
+        self.retention_months = retention_months
+        self.retention_mode = retention_mode
+
+    def partition_name(self, month: date) -> str:
+        return f"{self.table}_p{month.year:04d}{month.month:02d}"
+
+    def is_partitioned(self, conn) -> bool:
+        relkind = conn.execute(
+            text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": self.table},
+        ).scalar()
+        return relkind == "p"
+
+    def lock(self, conn):
+        # Every worker ensures partitions at import time; serialise the DDL so
+        # concurrent starts don't race on the catalog.
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"partitions:{self.table}"})
+
+    def create_partition(self, conn, name: str, bounds: str) -> bool:
+        try:
+            with conn.begin_nested():
+                conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {self.table} {bounds}"))
+            return True
+        except Exception as e:
+            logger.warning("Could not create partition %s: %s", name, e)
+            return False
+
+    def list_partitions(self, conn) -> List[str]:
+        rows = conn.execute(
+            text("""
+                SELECT c.relname
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = to_regclass(:table)
+                ORDER BY c.relname
+            """),
+            {"table": self.table},
+        ).scalars().all()
+        return list(rows)
+
+    def ensure_partitions(self, today: Optional[date] = None) -> List[str]:
+        current = _month_start(today or datetime.utcnow().date())
+        created = []
+        with self.engine.begin() as conn:
+            self.lock(conn)
+            if not self.is_partitioned(conn):
+                logger.warning("%s is not a partitioned table; skipping partition maintenance", self.table)
+                return created
+
+            existing = set(self.list_partitions(conn))
+            # Catch-all for points outside the pre-created range (clock skew,
+            # very old backfills) so ingest never fails on a missing partition.
+            default = f"{self.table}_default"
+            if default not in existing and self.create_partition(conn, default, "DEFAULT"):
+                created.append(default)
+
+            for offset in range(self.months_ahead + 1):
+                start = _add_months(current, offset)
+                name = self.partition_name(start)
+                if name in existing:
+                    continue
+                # Fails if the default partition already holds rows for this
+                # month; keep going with the other months.
+                bounds = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{_add_months(start, 1).isoformat()}')"
+                if self.create_partition(conn, name, bounds):
+                    created.append(name)
+        return created
+
+    def apply_retention(self, today: Optional[date] = None) -> List[str]:
+        if self.retention_months <= 0:
+            return []
+
+        cutoff = _add_months(_month_start(today or datetime.utcnow().date()), -self.retention_months)
+        retired = []
+        with self.engine.begin() as conn:
+            self.lock(conn)
+            if not self.is_partitioned(conn):
+                return retired
+
+            for name in self.list_partitions(conn):
+                match = PARTITION_NAME.search(name)
+                if not match:
+                    continue
+                month = date(int(match.group(1)), int(match.group(2)), 1)
+                if _add_months(month, 1) > cutoff:
+                    continue
+
+                if self.retention_mode == "drop":
+                    conn.execute(text(f"DROP TABLE {name}"))
+                else:
+                    conn.execute(text(f"ALTER TABLE {self.table} DETACH PARTITION {name}"))
+                retired.append(name)
+        return retired
+
+    def run_maintenance(self, today: Optional[date] = None) -> dict:
+        result = {
+            "created": self.ensure_partitions(today),
+            "retired": self.apply_retention(today),
+        }
+        if result["created"] or result["retired"]:
+            logger.info("%s partitions created: %s, retired: %s", self.table, result["created"], result["retired"])
+        return result
+
+
+def location_partition_manager(engine: Engine) -> PartitionManager:
+    return PartitionManager(
+        engine,
+        months_ahead=int(os.getenv("LOCATION_PARTITIONS_AHEAD", "3")),
+        retention_months=int(os.getenv("LOCATION_RETENTION_MONTHS", "0")),
+        retention_mode=os.getenv("LOCATION_RETENTION_MODE", "detach"),
+    )
@@ -0,0 +1,47 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+from app.schemas.locations_schema import LocationResponse
+
+
+# In-process read-through cache in front of asset_last_positions. Entries are
+# dropped on ingest for the assets that were written and expire after `ttl`
+# seconds so writes made by other workers become visible.
+class LastPositionCache:
+    def __init__(self, ttl: float = 30.0, maxsize: int = 100_000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, asset_id: int) -> Optional[LocationResponse]:
+        with self._lock:
+            entry = self._entries.get(asset_id)
+            if entry is None:
+                return None
+            expires_at, location = entry
+            if expires_at < time.monotonic():
+                del self._entries[asset_id]
+                return None
+            self._entries.move_to_end(asset_id)
+            return location
+
+    def set(self, location: LocationResponse):
+        with self._lock:
+            self._entries[location.asset_id] = (time.monotonic() + self.ttl, location)
+            self._entries.move_to_end(location.asset_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, asset_ids: Iterable[int]):
+        with self._lock:
+            for asset_id in asset_ids:
+                self._entries.pop(asset_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+last_position_cache = LastPositionCache()
@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from app.schemas.user_schema import Principal
+
+
+# Resolved principals keyed by JWT subject (username), so authenticated
+# requests skip the users lookup. Anything that changes what a principal may
+# do (role, disabled, password) must evict; the TTL bounds staleness for
+# changes made through another worker.
+class PrincipalCache:
+    def __init__(self, ttl: float = 60.0, maxsize: int = 10_000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, username: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[username]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(username)
+            return entry[1]
+
+    def set(self, principal: Principal):
+        with self._lock:
+            self._entries[principal.username] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(principal.username)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def evict(self, username: str):
+        with self._lock:
+            if self._entries.pop(username, None) is not None:
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+            }
+
+
+principal_cache = PrincipalCache(ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", "60")))
@@ -0,0 +1,204 @@
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.requests import Request
+
+# Opt-in: with QUERY_PROFILER unset nothing is recorded and the middleware is
+# not installed, so production pays only for a contextvar lookup per query.
+PROFILER_ENABLED = os.getenv("QUERY_PROFILER", "0").lower() in ("1", "true", "yes")
+REPEAT_THRESHOLD = int(os.getenv("QUERY_PROFILER_REPEAT_THRESHOLD", "5"))
+SLOW_MS = float(os.getenv("QUERY_PROFILER_SLOW_MS", "500"))
+HISTORY_SIZE = int(os.getenv("QUERY_PROFILER_HISTORY", "200"))
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+|\?")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS = re.compile(r"(\(\?\))(?:\s*,\s*\(\?\))+")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    # Literals and bind parameters become ?, IN lists and multi-row VALUES
+    # collapse to one element, so the same query shape always maps to the
+    # same text regardless of its arguments or batch size.
+    shape = _STRING.sub("?", statement)
+    shape = _PARAM.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _LIST.sub("(?)", shape)
+    shape = _ROWS.sub(r"\1", shape)
+    return _SPACE.sub(" ", shape).strip()
+
+
+class QueryProfile:
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status: Optional[int] = None
+        self.statements: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration: float, executemany: bool):
+        with self._lock:
+            self.statements.append((normalize_statement(statement), duration * 1000, executemany))
+
+    def finish(self, status: Optional[int] = None):
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        self.status = status
+
+    def shapes(self) -> List[dict]:
+        grouped: Dict[str, dict] = {}
+        for shape, duration_ms, executemany in self.statements:
+            entry = grouped.setdefault(shape, {"statement": shape, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "executemany": executemany})
+            entry["count"] += 1
+            entry["total_ms"] += duration_ms
+            entry["max_ms"] = max(entry["max_ms"], duration_ms)
+        for entry in grouped.values():
+            entry["total_ms"] = round(entry["total_ms"], 3)
+            entry["max_ms"] = round(entry["max_ms"], 3)
+            entry["repeated"] = entry["count"] >= REPEAT_THRESHOLD
+        return sorted(grouped.values(), key=lambda e: e["total_ms"], reverse=True)
+
+    @property
+    def slow(self) -> bool:
+        return self.duration_ms is not None and self.duration_ms >= SLOW_MS
+
+    def to_dict(self, shapes: Optional[List[dict]] = None) -> dict:
+        shapes = shapes if shapes is not None else self.shapes()
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "query_count": len(self.statements),
+            "query_ms": round(sum(s[1] for s in self.statements), 3),
+            "slow": self.slow,
+            "repeated_shapes": [s["statement"] for s in shapes if s["repeated"]],
+            "shapes": shapes,
+        }
+
+
+_current: ContextVar[Optional[QueryProfile]] = ContextVar("query_profile", default=None)
+
+
+class QueryProfiler:
+    def __init__(self, history_size: int = HISTORY_SIZE):
+        self.history = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+
+    def instrument(self, engine: Engine):
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            if _current.get() is not None:
+                context._profile_started = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            profile = _current.get()
+            started = getattr(context, "_profile_started", None)
+            if profile is not None and started is not None:
+                profile.record(statement, time.perf_counter() - started, executemany)
+
+    def start(self, kind: str, name: str):
+        profile = QueryProfile(kind, name)
+        return profile, _current.set(profile)
+
+    def stop(self, profile: QueryProfile, token, status: Optional[int] = None):
+        _current.reset(token)
+        profile.finish(status)
+        shapes = profile.shapes()
+        with self._lock:
+            self.history.append(profile)
+        repeated = [s for s in shapes if s["repeated"]]
+        if profile.slow or repeated:
+            self.log(profile, shapes, repeated)
+
+    def log(self, profile: QueryProfile, shapes: List[dict], repeated: List[dict]):
+        reasons = []
+        if profile.slow:
+            reasons.append(f"slow ({profile.duration_ms:.0f} ms)")
+        if repeated:
+            reasons.append(f"{len(repeated)} repeated statement shape(s)")
+        print(f"Query profile for {profile.kind} {profile.name}: {', '.join(reasons)}, {len(profile.statements)} queries")
+        for shape in shapes:
+            marker = " REPEATED" if shape["repeated"] else ""
+            print(f"  {shape['count']:>5}x {shape['total_ms']:>9.2f} ms{marker}  {shape['statement'][:300]}")
+
+    def profiles(self, kind: Optional[str] = None, flagged_only: bool = False, limit: int = 50) -> List[dict]:
+        with self._lock:
+            recent = list(self.history)
+        results = []
+        for profile in reversed(recent):
+            if kind and profile.kind != kind:
+                continue
+            data = profile.to_dict()
+            if flagged_only and not (data["slow"] or data["repeated_shapes"]):
+                continue
+            results.append(data)
+            if len(results) >= limit:
+                break
+        return results
+
+    def summary(self, limit: int = 25) -> List[dict]:
+        # Statement shapes across everything in the buffer, by total time.
+        with self._lock:
+            recent = list(self.history)
+        totals: Dict[str, dict] = {}
+        for profile in recent:
+            for shape in profile.shapes():
+                entry = totals.setdefault(shape["statement"], {"statement": shape["statement"], "count": 0, "total_ms": 0.0, "profiles": set(), "repeated_in": set()})
+                entry["count"] += shape["count"]
+                entry["total_ms"] += shape["total_ms"]
+                entry["profiles"].add(profile.name)
+                if shape["repeated"]:
+                    entry["repeated_in"].add(profile.name)
+        ranked = sorted(totals.values(), key=lambda e: e["total_ms"], reverse=True)[:limit]
+        return [
+            {**entry, "total_ms": round(entry["total_ms"], 3), "profiles": sorted(entry["profiles"]), "repeated_in": sorted(entry["repeated_in"])}
+            for entry in ranked
+        ]
+
+    def clear(self):
+        with self._lock:
+            self.history.clear()
+
+
+query_profiler = QueryProfiler()
+
+
+@asynccontextmanager
+async def profile_job(name: str):
+    if not PROFILER_ENABLED:
+        yield
+        return
+    profile, token = query_profiler.start("job", name)
+    try:
+        yield
+    finally:
+        query_profiler.stop(profile, token)
+
+
+async def profiler_middleware(request: Request, call_next):
+    profile, token = query_profiler.start("request", f"{request.method} {request.url.path}")
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        if route is not None:
+            profile.name = f"{request.method} {route.path}"
+        query_profiler.stop(profile, token, status)
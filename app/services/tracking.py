@@ -0,0 +1,114 @@
+import asyncio
+import time
+from typing import Dict, Iterable, Optional, Set
+from fastapi import WebSocket
+from app.schemas.locations_schema import LocationResponse
+from app.services.metrics import BROADCAST_DROPPED, BROADCAST_SEND_LATENCY
+from app.services.multiplex import ClientRegistry
+
+
+class AssetSubscription:
+    def __init__(self, asset_id: int, queue_size: int):
+        self.asset_id = asset_id
+        self.websockets: Set[WebSocket] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: Optional[asyncio.Task] = None
+
+
+# At most one subscription (queue + sender task) per asset: created by the first
+# viewer, torn down when the last one leaves. Ingest calls publish() after commit;
+# with a backplane (app.services.backplane) updates reach every worker's hub.
+class TrackingHub:
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.subscriptions: Dict[int, AssetSubscription] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.backplane = None
+        # Multiplexed /ws/track sockets; per-asset sockets use subscriptions.
+        self.clients = ClientRegistry()
+        self._pending: Set[asyncio.Task] = set()
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+
+    async def subscribe(self, websocket: WebSocket, asset_id: int):
+        await websocket.accept()
+        subscription = self.subscriptions.get(asset_id)
+        if subscription is None:
+            subscription = AssetSubscription(asset_id, self.queue_size)
+            subscription.task = asyncio.create_task(self._pump(subscription))
+            self.subscriptions[asset_id] = subscription
+        subscription.websockets.add(websocket)
+
+    def unsubscribe(self, websocket: WebSocket, asset_id: int):
+        subscription = self.subscriptions.get(asset_id)
+        if subscription is None:
+            return
+        subscription.websockets.discard(websocket)
+        if not subscription.websockets:
+            subscription.task.cancel()
+            del self.subscriptions[asset_id]
+
+    async def start_backplane(self, backplane):
+        # With a backplane, publish() goes through it and every worker's hub
+        # (this one included) receives the batch via _enqueue.
+        self.backplane = backplane
+        await backplane.start(self._enqueue)
+
+    async def stop_backplane(self):
+        if self.backplane is not None:
+            await self.backplane.stop()
+            self.backplane = None
+
+    def publish(self, locations: Iterable[LocationResponse]):
+        # Safe from the event loop and from worker threads alike: queues are
+        # only ever touched on the loop via call_soon_threadsafe.
+        if self.loop is None:
+            return
+        if self.backplane is not None:
+            # Viewers may be on any worker, so everything is published once.
+            messages = [loc.model_dump(mode="json") for loc in locations]
+            if messages:
+                self.loop.call_soon_threadsafe(self._publish_remote, messages)
+            return
+        messages = [
+            loc.model_dump(mode="json") for loc in locations
+            if loc.asset_id in self.subscriptions or self.clients.wants(loc.asset_id)
+        ]
+        if messages:
+            self.loop.call_soon_threadsafe(self._enqueue, messages)
+
+    def _publish_remote(self, messages):
+        task = asyncio.create_task(self.backplane.publish(messages))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def _enqueue(self, messages):
+        self.clients.dispatch(messages)
+        for message in messages:
+            subscription = self.subscriptions.get(message["asset_id"])
+            if subscription is None:
+                continue
+            if subscription.queue.full():
+                # Slow viewers only need the newest position; drop the oldest.
+                subscription.queue.get_nowait()
+                BROADCAST_DROPPED.inc()
+            subscription.queue.put_nowait(message)
+
+    async def send_message(self, websocket: WebSocket, asset_id: int, message: dict):
+        started = time.perf_counter()
+        try:
+            await websocket.send_json(message)
+            BROADCAST_SEND_LATENCY.observe(time.perf_counter() - started)
+        except Exception as e:
+            self.unsubscribe(websocket, asset_id)
+            print(f"Error sending message: {e}")
+
+    async def _pump(self, subscription: AssetSubscription):
+        while True:
+            message = await subscription.queue.get()
+            for websocket in list(subscription.websockets):
+                await self.send_message(websocket, subscription.asset_id, message)
+
+
+hub = TrackingHub()
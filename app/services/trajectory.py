@@ -0,0 +1,123 @@
+from typing import List, Optional, Sequence
+import numpy as np
+from app.schemas.locations_schema import LocationResponse
+
+EARTH_RADIUS_M = 6_371_008.8
+
+# Most raw points a downsampling request will read before simplifying.
+DOWNSAMPLE_SOURCE_LIMIT = 50_000
+
+
+def project_to_meters(lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    # Equirectangular projection around the track's mean latitude; accurate
+    # enough for perpendicular distances within a single trajectory.
+    lat0 = np.radians(lat.mean())
+    x = np.radians(lon) * np.cos(lat0) * EARTH_RADIUS_M
+    y = np.radians(lat) * EARTH_RADIUS_M
+    return np.column_stack((x, y))
+
+
+def douglas_peucker_importance(xy: np.ndarray) -> np.ndarray:
+    # Runs Douglas-Peucker to completion once and records, for each point, the
+    # tolerance below which it would be kept. Thresholding the result gives
+    # the classic DP output for any tolerance; taking the top k gives the best
+    # k-point approximation in DP order. Endpoints are always kept.
+    n = len(xy)
+    importance = np.zeros(n)
+    if n == 0:
+        return importance
+    importance[0] = importance[-1] = np.inf
+
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        start, end, parent = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = xy[start], xy[end]
+        segment = xy[start + 1:end]
+        ab = b - a
+        denom = ab @ ab
+        if denom > 0:
+            t = np.clip(((segment - a) @ ab) / denom, 0.0, 1.0)
+            distances = np.linalg.norm(segment - (a + t[:, None] * ab), axis=1)
+        else:
+            distances = np.linalg.norm(segment - a, axis=1)
+
+        offset = int(np.argmax(distances))
+        index = start + 1 + offset
+        # Clamp to the parent's value so importance is monotone down the
+        # recursion and a threshold never keeps a child without its parent.
+        importance[index] = min(distances[offset], parent)
+        stack.append((start, index, importance[index]))
+        stack.append((index, end, importance[index]))
+    return importance
+
+
+def stop_boundaries(xy: np.ndarray, seconds: np.ndarray, radius_m: float, min_duration_s: float) -> np.ndarray:
+    # Marks the first and last point of every stop: a run of points that all
+    # stay within `radius_m` of the run's first point for at least
+    # `min_duration_s`. Anchoring on the first point (rather than looking at
+    # step lengths) keeps slow driving from reading as a stop and GPS jitter
+    # around a parked asset from splitting one.
+    n = len(xy)
+    keep = np.zeros(n, dtype=bool)
+    start = 0
+    while start < n - 1:
+        # Find the first point that leaves the radius, looking ahead in
+        # growing chunks so a moving track costs one small chunk per anchor.
+        end = n
+        offset, chunk = start + 1, 64
+        while offset < n:
+            window = xy[offset:offset + chunk]
+            outside = np.flatnonzero(np.linalg.norm(window - xy[start], axis=1) > radius_m)
+            if len(outside):
+                end = offset + int(outside[0])
+                break
+            offset += chunk
+            chunk *= 2
+
+        last = end - 1
+        if last > start and seconds[last] - seconds[start] >= min_duration_s:
+            keep[start] = keep[last] = True
+            start = end
+        else:
+            start += 1
+    return keep
+
+
+def downsample_locations(
+    locations: Sequence[LocationResponse],
+    max_points: Optional[int] = None,
+    tolerance_m: Optional[float] = None,
+    stop_radius_m: float = 15.0,
+    stop_min_seconds: float = 120.0,
+) -> List[LocationResponse]:
+    if len(locations) <= 2 or (max_points is None and tolerance_m is None):
+        return list(locations)
+
+    # Simplify in time order, hand back in the caller's order.
+    order = sorted(range(len(locations)), key=lambda i: (locations[i].timestamp, locations[i].id))
+    ordered = [locations[i] for i in order]
+
+    lon = np.fromiter((loc.longitude for loc in ordered), dtype=float, count=len(ordered))
+    lat = np.fromiter((loc.latitude for loc in ordered), dtype=float, count=len(ordered))
+    seconds = np.fromiter((loc.timestamp.timestamp() for loc in ordered), dtype=float, count=len(ordered))
+    xy = project_to_meters(lon, lat)
+
+    importance = douglas_peucker_importance(xy)
+    importance[stop_boundaries(xy, seconds, stop_radius_m, stop_min_seconds)] = np.inf
+
+    if tolerance_m is not None:
+        keep = importance >= tolerance_m
+    else:
+        keep = np.ones(len(ordered), dtype=bool)
+    if max_points is not None and keep.sum() > max_points:
+        candidates = np.flatnonzero(keep)
+        ranked = candidates[np.argsort(-importance[candidates], kind="stable")]
+        # Forced points (endpoints, stops) are infinite and so always rank
+        # first; they are kept even if they alone exceed max_points.
+        forced = int(np.isinf(importance[candidates]).sum())
+        keep = np.zeros(len(ordered), dtype=bool)
+        keep[ranked[:max(max_points, forced)]] = True
+
+    return [locations[i] for i in sorted(order[i] for i in np.flatnonzero(keep))]
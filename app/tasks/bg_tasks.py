@@ -1,103 +1,56 @@
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from database import SessionLocal
-from app.models.locations_model import AssetLocation
-from app.models.assets_model import Asset
-from app.models.geo_models import GeoAlert, GeoZone
-from sqlalchemy import func
-from sqlalchemy.sql import and_
-from app.crud.geo_crud import create_geo_alert
-from sqlalchemy.sql import text
-from typing import List
-
-def get_stale_assets(db: Session) -> List[Asset]:
-    threshold = datetime.utcnow() - timedelta(minutes=10)
-    
-    recent_assets_subq = db.query(
-        AssetLocation.asset_id
-    ).filter(
-        AssetLocation.timestamp >= threshold
-    ).distinct().subquery()
-    
-    return db.query(Asset).filter(
-        ~Asset.id.in_(db.query(recent_assets_subq.c.asset_id))
-    ).all()
-
-def check_asset_in_zone1(db: Session, asset_id: int):
-    latest_location = db.query(
-        AssetLocation.location
-    ).filter(
-        AssetLocation.asset_id == asset_id
-    ).order_by(
-        AssetLocation.timestamp.desc()
-    ).first()
-
-    if not latest_location:
-        return False, None, None  
-
-    zone_exists = db.query(GeoZone).filter(
-        GeoZone.asset_id == asset_id,
-        func.ST_Contains(GeoZone.zone, latest_location.location)
-    ).first()
-
-    coords = None
-    if zone_exists:
-        coords = db.query(
-            func.ST_X(latest_location.location),
-            func.ST_Y(latest_location.location)
-        ).first()
-
-    return bool(zone_exists), coords[0] if coords else None, coords[1] if coords else None
-
-def check_geo_fences():
-    db = SessionLocal()
-    try:
-
-        subquery = db.query(
-            AssetLocation.asset_id,
-            func.max(AssetLocation.timestamp).label('max_time')
-        ).group_by(
-            AssetLocation.asset_id
-        ).subquery()
-
-        latest_locations = db.query(AssetLocation).join(
-            subquery,
-            and_(
-                AssetLocation.asset_id == subquery.c.asset_id,
-                AssetLocation.timestamp == subquery.c.max_time
-            )
-        ).all()
-
-        for location in latest_locations:
-            in_zone, lon, lat = check_asset_in_zone1(db, location.asset_id)
-            if not in_zone:
-                create_geo_alert(
-                    db,
-                    location.asset_id,
-                    "exit_zone",
-                    f"Asset {location.asset_id} exited geo-fence at {lon},{lat}"
-                )
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        raise e
-    finally:
-        db.close()
-
-def check_stale_locations():
-    db = SessionLocal()
-    try:
-        stale_assets = get_stale_assets(db)
-        for asset in stale_assets:
-            create_geo_alert(
-                db,
-                asset.id,
-                "stale_data",
-                f"Asset {asset.id} has no updates for 10+ minutes"
-            )
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        raise e
-    finally:
-        db.close()
\ No newline at end of file
+from datetime import datetime, timedelta, timezone
+from fastapi.concurrency import run_in_threadpool
+from async_database import AsyncSessionLocal
+from database import engine
+from sqlalchemy import func, select
+from typing import Optional, Tuple
+from app.crud.geo_crud import open_stale_alerts, evaluate_geofence_transitions, apply_geofence_transitions
+from app.crud.tasks_crud import get_watermark, set_watermark
+from app.services.metrics import JOB_ASSETS, track_job
+from app.services.partitions import location_partition_manager
+from app.services.profiler import profile_job
+
+GEOFENCE_WATERMARK = "geo_fences"
+GEOFENCE_WATERMARK_OVERLAP = timedelta(minutes=1)
+
+partition_manager = location_partition_manager(engine)
+
+async def check_geo_fences(shard: Optional[Tuple[int, int]] = None) -> int:
+    # Reconciliation only: ingest already evaluates fences per write, so the
+    # sweep looks at assets whose last position moved since the previous run.
+    # The overlap covers ingest transactions that committed after we started.
+    # Each shard (index, count) of the asset ids keeps its own watermark.
+    watermark_name = GEOFENCE_WATERMARK if shard is None else f"{GEOFENCE_WATERMARK}:{shard[0]}/{shard[1]}"
+    async with profile_job("check_geo_fences"), track_job("check_geo_fences"), AsyncSessionLocal() as db:
+        try:
+            started_at = (await db.execute(select(func.now()))).scalar()
+            watermark = await get_watermark(db, watermark_name)
+            since = watermark - GEOFENCE_WATERMARK_OVERLAP if watermark else None
+
+            transitions = await evaluate_geofence_transitions(db, since=since, shard=shard)
+            await apply_geofence_transitions(db, transitions)
+            await set_watermark(db, watermark_name, started_at)
+            await db.commit()
+            JOB_ASSETS.labels("check_geo_fences").set(len(transitions))
+            return len(transitions)
+        except Exception as e:
+            await db.rollback()
+            raise e
+
+async def check_stale_locations(shard: Optional[Tuple[int, int]] = None) -> int:
+    async with profile_job("check_stale_locations"), track_job("check_stale_locations"), AsyncSessionLocal() as db:
+        try:
+            threshold = datetime.now(timezone.utc) - timedelta(minutes=10)
+            stale = await open_stale_alerts(db, threshold, shard)
+            await db.commit()
+            JOB_ASSETS.labels("check_stale_locations").set(stale)
+            return stale
+        except Exception as e:
+            await db.rollback()
+            raise e
+
+async def maintain_location_partitions(shard: Optional[Tuple[int, int]] = None) -> int:
+    # Partition DDL goes through the sync engine; keep it off the event loop.
+    async with track_job("maintain_location_partitions"):
+        result = await run_in_threadpool(partition_manager.run_maintenance)
+    return len(result["created"]) + len(result["retired"])
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import random
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from async_database import AsyncSessionLocal, async_engine
+from app.crud.tasks_crud import claim_task_run, finish_task_run, prune_task_runs
+from app.tasks.bg_tasks import check_geo_fences, check_stale_locations, maintain_location_partitions
+
+ShardJob = Callable[[Optional[Tuple[int, int]]], Awaitable[int]]
+
+
+class ScheduledTask:
+    def __init__(self, name: str, interval_seconds: int, job: ShardJob, shards: int = 1):
+        if shards < 1:
+            raise ValueError("shards must be at least 1")
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.job = job
+        self.shards = shards
+
+
+# Every worker process runs a Scheduler; they coordinate only through
+# PostgreSQL. Each tick a worker walks the task's shards in random order and
+# for each one:
+#   1. takes a session advisory lock on (task, shard), so a run that overruns
+#      its interval is never started twice concurrently;
+#   2. claims the current interval slot in task_runs (unique per task, shard
+#      and slot), so each shard runs exactly once per interval;
+#   3. runs the job for that shard and records the outcome on the run row.
+# Shards are claimed one at a time right before they run, so with several
+# workers ticking the shards of a large sweep spread across them.
+class Scheduler:
+    def __init__(self, worker_id: Optional[str] = None, tick_seconds: float = 15, history_days: int = 14):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.tick_seconds = tick_seconds
+        self.history_days = history_days
+        self.tasks: List[ScheduledTask] = []
+        # Last slot each (task, shard) was run by this worker, to skip the
+        # database until the next interval starts.
+        self.claimed_slots: Dict[Tuple[str, int], int] = {}
+        self._runner: Optional[asyncio.Task] = None
+
+    def add(self, task: ScheduledTask):
+        self.tasks.append(task)
+
+    def start(self):
+        if self._runner is None:
+            self._runner = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+
+    async def _loop(self):
+        # Stagger workers a little so they don't all hit the lock at once.
+        await asyncio.sleep(random.uniform(0, min(self.tick_seconds, 5)))
+        while True:
+            for task in self.tasks:
+                try:
+                    await self.run_due(task)
+                except Exception as e:
+                    print(f"Scheduler error in {task.name}: {e}")
+            await asyncio.sleep(self.tick_seconds)
+
+    async def run_due(self, task: ScheduledTask):
+        local_slot = int(time.time() // task.interval_seconds)
+        shards = list(range(task.shards))
+        random.shuffle(shards)
+        for shard in shards:
+            if self.claimed_slots.get((task.name, shard)) == local_slot:
+                continue
+            await self.try_run(task, shard, local_slot)
+
+    async def try_run(self, task: ScheduledTask, shard: int, local_slot: int) -> bool:
+        async with async_engine.connect() as lock_conn:
+            locked = (await lock_conn.execute(
+                text("SELECT pg_try_advisory_lock(hashtext(:name), :shard)"),
+                {"name": task.name, "shard": shard},
+            )).scalar()
+            await lock_conn.commit()
+            if not locked:
+                return False
+            try:
+                async with AsyncSessionLocal() as db:
+                    run_id = await claim_task_run(db, task.name, shard, task.shards, task.interval_seconds, self.worker_id)
+                if run_id is None:
+                    return False
+                self.claimed_slots[(task.name, shard)] = local_slot
+                await self._execute(task, shard, run_id)
+                return True
+            finally:
+                await lock_conn.execute(
+                    text("SELECT pg_advisory_unlock(hashtext(:name), :shard)"),
+                    {"name": task.name, "shard": shard},
+                )
+                await lock_conn.commit()
+
+    async def _execute(self, task: ScheduledTask, shard: int, run_id: int):
+        status, processed, error = "succeeded", None, None
+        try:
+            processed = await task.job((shard, task.shards) if task.shards > 1 else None)
+        except Exception as e:
+            status, error = "failed", str(e)[:2000]
+            print(f"Scheduled task {task.name} shard {shard} failed: {e}")
+        async with AsyncSessionLocal() as db:
+            await finish_task_run(db, run_id, status, processed, error)
+            if shard == 0 and self.history_days > 0:
+                await prune_task_runs(db, datetime.now(timezone.utc) - timedelta(days=self.history_days))
+
+
+def build_scheduler() -> Scheduler:
+    scheduler = Scheduler(
+        tick_seconds=float(os.getenv("SCHEDULER_TICK_SECONDS", "15")),
+        history_days=int(os.getenv("SCHEDULER_HISTORY_DAYS", "14")),
+    )
+    scheduler.add(ScheduledTask(
+        "check_geo_fences",
+        int(os.getenv("GEOFENCE_SWEEP_INTERVAL_SECONDS", "300")),
+        check_geo_fences,
+        shards=int(os.getenv("GEOFENCE_SWEEP_SHARDS", "1")),
+    ))
+    scheduler.add(ScheduledTask(
+        "check_stale_locations",
+        int(os.getenv("STALE_SWEEP_INTERVAL_SECONDS", "300")),
+        check_stale_locations,
+        shards=int(os.getenv("STALE_SWEEP_SHARDS", "1")),
+    ))
+    scheduler.add(ScheduledTask(
+        "maintain_location_partitions",
+        int(os.getenv("PARTITION_MAINTENANCE_INTERVAL_SECONDS", str(60 * 60 * 24))),
+        maintain_location_partitions,
+    ))
+    return scheduler
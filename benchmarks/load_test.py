@@ -0,0 +1,338 @@
+# End-to-end load test: N simulated devices post locations at a fixed rate
+# while M WebSocket viewers follow them, then the geofence and stale-data
+# sweeps run against the seeded fleet. Reports latency percentiles,
+# throughput, DB queries per operation and sweep durations.
+#
+# By default the app is started in-process (uvicorn on a background thread)
+# so database queries can be counted; pass --base-url to load a server that
+# is already running (queries are then only counted for the sweeps).
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+import websockets
+from sqlalchemy import event
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from async_database import async_engine, AsyncSessionLocal  # noqa: E402
+from database import engine  # noqa: E402
+from app.tasks.bg_tasks import check_geo_fences, check_stale_locations, GEOFENCE_WATERMARK  # noqa: E402
+
+API = "/api/v1"
+
+
+class QueryCounter:
+    def __init__(self, *engines):
+        self.count = 0
+        self._lock = threading.Lock()
+        for eng in engines:
+            event.listen(eng, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.count += 1
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self.samples: List[float] = []
+        self.errors = 0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {"count": 0, "errors": self.errors}
+        values = np.array(self.samples) * 1000
+        return {
+            "count": len(values),
+            "errors": self.errors,
+            "mean_ms": round(float(values.mean()), 2),
+            "p50_ms": round(float(np.percentile(values, 50)), 2),
+            "p95_ms": round(float(np.percentile(values, 95)), 2),
+            "p99_ms": round(float(np.percentile(values, 99)), 2),
+            "max_ms": round(float(values.max()), 2),
+        }
+
+
+def start_server(port: int):
+    # The benchmark drives the sweeps itself; the app's scheduler would run
+    # them concurrently and skew both the ingest numbers and the sweep timings.
+    os.environ["SCHEDULER_ENABLED"] = "0"
+    import uvicorn
+    import main
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 30
+    while not server.started:
+        if time.time() > deadline or not thread.is_alive():
+            raise RuntimeError("In-process server did not start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def zone_square(lon: float, lat: float, half_size: float) -> List[List[float]]:
+    return [
+        [lon - half_size, lat - half_size],
+        [lon + half_size, lat - half_size],
+        [lon + half_size, lat + half_size],
+        [lon - half_size, lat + half_size],
+        [lon - half_size, lat - half_size],
+    ]
+
+
+async def seed_fleet(client: httpx.AsyncClient, args) -> Dict[int, tuple]:
+    username = f"bench_{uuid.uuid4().hex[:8]}"
+    password = uuid.uuid4().hex
+    response = await client.post(f"{API}/auth/register", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": password,
+        "role": "admin",
+        "admin_secret_code": args.admin_secret,
+    })
+    response.raise_for_status()
+    user_id = response.json()["id"]
+
+    response = await client.post(f"{API}/auth/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+    rng = random.Random(args.seed)
+    fleet = {}
+    for i in range(args.devices):
+        response = await client.post(f"{API}/assets/", json={
+            "name": f"bench asset {i}",
+            "asset_type": rng.choice(["truck", "van", "trailer"]),
+            "unique_id": f"{username}-{i}",
+            "user_id": user_id,
+        })
+        response.raise_for_status()
+        fleet[response.json()["id"]] = (rng.uniform(-120, 120), rng.uniform(-60, 60))
+
+    # Each asset gets a square zone around its start; the random walk drifts
+    # in and out of it, so the sweeps have real transitions to process.
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [zone_square(lon, lat, args.zone_size)]},
+            "properties": {"asset_id": asset_id, "name": f"bench zone {asset_id}"},
+        }
+        for asset_id, (lon, lat) in fleet.items()
+        for _ in range(args.zones_per_asset)
+    ]
+    for start in range(0, len(features), 5000):
+        response = await client.post(f"{API}/geo/zones/import", json={
+            "type": "FeatureCollection",
+            "features": features[start:start + 5000],
+        })
+        response.raise_for_status()
+    return fleet
+
+
+async def run_device(client: httpx.AsyncClient, asset_id: int, origin: tuple, args, stop_at: float, recorder: LatencyRecorder):
+    rng = random.Random(asset_id)
+    lon, lat = origin
+    interval = 1.0 / args.rate
+    # Latency is measured from the scheduled send time, so a stalled server
+    # shows up as latency instead of silently lowering the offered load.
+    scheduled = time.perf_counter() + rng.uniform(0, interval)
+    while scheduled < stop_at:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        lon = max(-180.0, min(180.0, lon + rng.gauss(0, args.zone_size / 3)))
+        lat = max(-90.0, min(90.0, lat + rng.gauss(0, args.zone_size / 3)))
+        try:
+            response = await client.post(f"{API}/track/{asset_id}", json={
+                "longitude": lon,
+                "latitude": lat,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+            })
+            if response.status_code != 200:
+                recorder.errors += 1
+            else:
+                recorder.add(time.perf_counter() - scheduled)
+        except httpx.HTTPError:
+            recorder.errors += 1
+        scheduled += interval
+
+
+async def run_viewer(ws_url: str, asset_id: int, stop_at: float, recorder: LatencyRecorder):
+    # Broadcast latency: receive time minus the point's own timestamp, which
+    # the device set just before posting (same host, same clock).
+    try:
+        connected_at = datetime.now(timezone.utc)
+        async with websockets.connect(f"{ws_url}/ws/track/{asset_id}") as ws:
+            seen = set()
+            while True:
+                remaining = stop_at - time.perf_counter()
+                if remaining <= 0:
+                    return
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    return
+                message = json.loads(raw)
+                sent = datetime.fromisoformat(message["timestamp"])
+                # The server only sends a snapshot when the asset already has
+                # a position; it predates the connection, broadcasts don't.
+                # A point posted while subscribing can arrive as both.
+                if sent < connected_at or message.get("id") in seen:
+                    continue
+                seen.add(message.get("id"))
+                recorder.add((datetime.now(timezone.utc) - sent).total_seconds())
+    except (OSError, websockets.WebSocketException):
+        recorder.errors += 1
+
+
+async def reset_watermark():
+    from sqlalchemy import text
+    async with AsyncSessionLocal() as db:
+        # Sharded sweeps keep one watermark per shard, named "<name>:<i>/<n>".
+        await db.execute(
+            text("DELETE FROM task_watermarks WHERE name = :name OR name LIKE :name || ':%'"),
+            {"name": GEOFENCE_WATERMARK},
+        )
+        await db.commit()
+
+
+async def run_on_loop(coro, loop: Optional[asyncio.AbstractEventLoop]):
+    # With an in-process server the async engine's pooled connections belong
+    # to the server's event loop, so DB work has to run there too.
+    if loop is None:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+async def run_sweeps(args, counter: QueryCounter, loop: Optional[asyncio.AbstractEventLoop]) -> dict:
+    results = {}
+    for name, job in (("check_geo_fences", check_geo_fences), ("check_stale_locations", check_stale_locations)):
+        timings = LatencyRecorder()
+        queries = []
+        for i in range(args.sweeps):
+            if name == "check_geo_fences" and args.full_sweep:
+                await run_on_loop(reset_watermark(), loop)
+            before = counter.count
+            started = time.perf_counter()
+            await run_on_loop(job(), loop)
+            timings.add(time.perf_counter() - started)
+            queries.append(counter.count - before)
+        results[name] = {**timings.summary(), "queries_per_run": max(queries) if queries else 0}
+    return results
+
+
+async def main(args) -> dict:
+    counter = QueryCounter(engine, async_engine.sync_engine)
+    server_loop = None
+    base_url = args.base_url
+    if base_url is None:
+        start_server(args.port)
+        from app.services.tracking import hub
+        server_loop = hub.loop
+        base_url = f"http://127.0.0.1:{args.port}"
+    ws_url = "ws" + base_url[len("http"):]
+
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        seed_started = time.perf_counter()
+        fleet = await seed_fleet(client, args)
+        seed_seconds = time.perf_counter() - seed_started
+
+        asset_ids = list(fleet)
+        ingest = LatencyRecorder()
+        broadcast = LatencyRecorder()
+        started = time.perf_counter()
+        stop_at = started + args.duration
+
+        viewers = [
+            asyncio.create_task(run_viewer(ws_url, asset_ids[i % len(asset_ids)], stop_at + 1, broadcast))
+            for i in range(args.ws_clients)
+        ]
+        await asyncio.sleep(0.5)
+        queries_before = counter.count
+        await asyncio.gather(*(
+            run_device(client, asset_id, origin, args, stop_at, ingest)
+            for asset_id, origin in fleet.items()
+        ))
+        elapsed = time.perf_counter() - started
+        ingest_queries = counter.count - queries_before
+        await asyncio.gather(*viewers)
+
+    sweeps = await run_sweeps(args, counter, server_loop)
+    requests_done = len(ingest.samples)
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k != "admin_secret"},
+        "seed_seconds": round(seed_seconds, 2),
+        "ingest": {
+            **ingest.summary(),
+            "throughput_rps": round(requests_done / elapsed, 1) if elapsed else 0,
+            "queries_per_request": round(ingest_queries / requests_done, 2) if requests_done and args.base_url is None else None,
+        },
+        "broadcast": broadcast.summary(),
+        "sweeps": sweeps,
+    }
+    return report
+
+
+def print_report(report: dict):
+    ingest = report["ingest"]
+    print(f"seeded fleet in {report['seed_seconds']}s")
+    print(
+        f"ingest     n={ingest['count']} errors={ingest['errors']} {ingest['throughput_rps']} req/s "
+        f"p50={ingest.get('p50_ms')}ms p95={ingest.get('p95_ms')}ms p99={ingest.get('p99_ms')}ms "
+        f"queries/req={ingest['queries_per_request']}"
+    )
+    broadcast = report["broadcast"]
+    print(
+        f"broadcast  n={broadcast['count']} errors={broadcast['errors']} "
+        f"p50={broadcast.get('p50_ms')}ms p95={broadcast.get('p95_ms')}ms p99={broadcast.get('p99_ms')}ms"
+    )
+    for name, sweep in report["sweeps"].items():
+        print(
+            f"{name:<22} runs={sweep['count']} p50={sweep.get('p50_ms')}ms "
+            f"max={sweep.get('max_ms')}ms queries/run={sweep['queries_per_run']}"
+        )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test ingest, live tracking and the geofence sweeps")
+    parser.add_argument("--base-url", help="Target a running server instead of starting one in-process")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the in-process server")
+    parser.add_argument("--devices", type=int, default=50, help="Simulated devices, one asset each")
+    parser.add_argument("--rate", type=float, default=1.0, help="Posts per second per device")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of ingest load")
+    parser.add_argument("--ws-clients", type=int, default=20, help="WebSocket viewers, spread over the assets")
+    parser.add_argument("--zones-per-asset", type=int, default=1)
+    parser.add_argument("--zone-size", type=float, default=0.01, help="Half side of each zone square, in degrees")
+    parser.add_argument("--sweeps", type=int, default=3, help="Runs of each background sweep")
+    parser.add_argument("--full-sweep", action="store_true", help="Reset the geofence watermark before every sweep")
+    parser.add_argument("--max-connections", type=int, default=200, help="HTTP connection pool size")
+    parser.add_argument("--admin-secret", default=os.getenv("BENCH_ADMIN_SECRET", "accesstoadmin"))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this path")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    print_report(report)
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2, default=str))
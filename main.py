@@ -1,30 +1,40 @@
 from fastapi import FastAPI, Depends, HTTPException, status, WebSocket, Request, Query
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from app.models.users_model import User, Role
 from datetime import timedelta
 from database import Base, engine
-from app.router import assets_router, locations_router, auth_router, geo_router, export_router
+from app.router import assets_router, locations_router, auth_router, geo_router, export_router, rollups_router, profiler_router, tasks_router
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi_utils.tasks import repeat_every
 from database import Base, engine
-from app.tasks.bg_tasks import check_geo_fences, check_stale_locations
+from app.tasks.scheduler import build_scheduler
 from datetime import datetime
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
-from database import get_db
+from async_database import get_async_db, AsyncSessionLocal
 from app.auth import get_current_admin_user,get_current_user
 from typing import Optional 
 from app.models.assets_model import Asset
-from app.crud.locations_crud import create_asset_location, get_latest_asset_location, get_asset_location_history
+from app.crud.locations_crud import get_latest_asset_location, get_asset_location_history, backfill_last_positions
+from fastapi.concurrency import run_in_threadpool
+from app.services.trajectory import DOWNSAMPLE_SOURCE_LIMIT, downsample_locations
 from fastapi.responses import JSONResponse
 from sqlalchemy import text
 from fastapi import WebSocket, WebSocketDisconnect
 from app.schemas.locations_schema import LocationResponse
 import asyncio
-from database import SessionLocal
+import os
+from app.services.tracking import hub
+from app.services.backplane import build_backplane
+from app.services.multiplex import TrackingClient, apply_request
+from app.tasks.bg_tasks import partition_manager
+from app.services.metrics import instrument_engine, metrics_middleware, register_tracking_hub
+from app.services.profiler import PROFILER_ENABLED, profiler_middleware, query_profiler
+from async_database import async_engine
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
@@ -37,73 +47,60 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.middleware("http")(metrics_middleware)
+
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+instrument_engine(export_router.exporter.engine, "export")
+register_tracking_hub(hub)
+
+if PROFILER_ENABLED:
+    app.middleware("http")(profiler_middleware)
+    for profiled_engine in (engine, async_engine.sync_engine, export_router.exporter.engine):
+        query_profiler.instrument(profiled_engine)
+
 Base.metadata.create_all(bind=engine)
+partition_manager.ensure_partitions()
 
 app.include_router(auth_router.router, prefix="/api/v1")
 app.include_router(assets_router.router, prefix="/api/v1", tags=["assets"])
 app.include_router(locations_router.router, prefix="/api/v1")
 app.include_router(geo_router.router, prefix="/api/v1")
 app.include_router(export_router.router, prefix="/api/v1")
+app.include_router(rollups_router.router, prefix="/api/v1")
+app.include_router(profiler_router.router, prefix="/api/v1")
+app.include_router(tasks_router.router, prefix="/api/v1")
 
 @app.on_event("startup")
-@repeat_every(seconds=60 * 5)  
-def run_geo_checks():
-    try:
-        print("Geo checks started at:", datetime.now())
-        check_geo_fences()
-        check_stale_locations()
-    except Exception as e:
-        print(f"Error in run_geo_checks: {e}")
-    finally:
-        print("Geo checks completed at:", datetime.now())
-
-class WebSocketManager:
-    def __init__(self):
-        self.active_connections = {}
-
-    async def connect(self, websocket: WebSocket, asset_id: int):
-        await websocket.accept()
-        if asset_id not in self.active_connections:
-            self.active_connections[asset_id] = []
-        self.active_connections[asset_id].append(websocket)
-
-    def disconnect(self, websocket: WebSocket, asset_id: int):
-        if asset_id in self.active_connections:
-            self.active_connections[asset_id].remove(websocket)
-            if not self.active_connections[asset_id]:
-                del self.active_connections[asset_id]
-    
-    async def send_message(self, websocket: WebSocket, message: dict):
-        try:
-            await websocket.send_json(message)
-        except Exception as e:
-            self.disconnect(websocket, message.get("asset_id"))
-            print(f"Error sending message: {e}")
-
-
-    async def broadcast(self, asset_id: int, message: str):
-        if asset_id in self.active_connections:
-            for connection in self.active_connections[asset_id]:
-                await connection.send_text(message)
-
-manager = WebSocketManager()
-
-async def track_asset_location(asset_id: int):
-    while True:
-        db = SessionLocal()
-        try:
-            location_data = get_latest_asset_location(db, asset_id)
-            if location_data:
-                # Check if it's a Pydantic model or a dictionary
-                if isinstance(location_data, LocationResponse):
-                    await manager.broadcast(asset_id, location_data.model_dump())
-                else:
-                    await manager.broadcast(asset_id, dict(location_data))
-            await asyncio.sleep(2)  # Adjust interval as needed
-        except Exception as e:
-            print(f"Error in tracking: {e}")
-        finally:
-            db.close()
+async def seed_last_positions():
+    async with AsyncSessionLocal() as db:
+        await backfill_last_positions(db)
+
+@app.on_event("startup")
+async def bind_tracking_hub():
+    hub.bind_loop(asyncio.get_running_loop())
+    await hub.start_backplane(build_backplane())
+
+@app.on_event("shutdown")
+async def stop_tracking_backplane():
+    await hub.stop_backplane()
+
+scheduler = build_scheduler()
+
+@app.on_event("startup")
+async def start_scheduler():
+    # Runs in every worker; task_runs and advisory locks make sure each sweep
+    # shard still runs once per interval across the cluster.
+    if os.getenv("SCHEDULER_ENABLED", "1") == "1":
+        scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    await scheduler.stop()
+
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/track/{asset_id}", response_class=HTMLResponse)
 async def track_asset(request: Request, asset_id: int):
@@ -112,15 +109,44 @@ async def track_asset(request: Request, asset_id: int):
         "asset_id": asset_id
     })
 
+@app.websocket("/ws/track")
+async def multiplexed_tracking(websocket: WebSocket, encoding: str = "json", max_rate: float = 2.0):
+    # One socket for many assets: the client sends subscribe/unsubscribe ops
+    # (see app.services.multiplex.apply_request) and gets batched frames.
+    if encoding not in ("json", "msgpack"):
+        await websocket.close(code=1003)
+        return
+    await websocket.accept()
+    client = TrackingClient(websocket, encoding, max_rate)
+    hub.clients.add(client)
+    try:
+        while True:
+            try:
+                request = await client.receive()
+                if request is None:
+                    break
+                await apply_request(hub.clients, client, request)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                await client.send({"t": "error", "detail": str(e)})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.clients.remove(client)
+
 @app.websocket("/ws/track/{asset_id}")
 async def websocket_tracking(websocket: WebSocket, asset_id: int):
-    await manager.connect(websocket, asset_id)
-    asyncio.create_task(track_asset_location(asset_id))
+    await hub.subscribe(websocket, asset_id)
     try:
+        async with AsyncSessionLocal() as db:
+            location = await get_latest_asset_location(db, asset_id)
+        if location:
+            await hub.send_message(websocket, asset_id, location.model_dump(mode="json"))
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
-        manager.disconnect(websocket, asset_id)
+        pass
+    finally:
+        hub.unsubscribe(websocket, asset_id)
 
 from pydantic import BaseModel
 from datetime import datetime
@@ -136,26 +162,30 @@ class AssetLocationResponse(BaseModel):
 
 
 @app.get("/{asset_id}/history-page", response_class=HTMLResponse)
-def get_history_page(
+async def get_history_page(
     asset_id: int,
     request: Request,
     start_time: Optional[datetime] = Query(None),
     end_time: Optional[datetime] = Query(None),
-    db: Session = Depends(get_db),
+    max_points: int = Query(2000, ge=2, le=20000),
+    tolerance: Optional[float] = Query(None, gt=0),
+    db: AsyncSession = Depends(get_async_db),
 ):
     # Check if asset exists
-    asset = db.query(Asset).filter(Asset.id == asset_id).first()
+    asset = await db.get(Asset, asset_id)
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
 
     # Get asset location history
-    locations = get_asset_location_history(
+    locations = await get_asset_location_history(
         db,
         asset_id=asset_id,
         start_time=start_time,
         end_time=end_time,
-        limit=1000
+        limit=DOWNSAMPLE_SOURCE_LIMIT
     )
+    # CPU-bound on up to DOWNSAMPLE_SOURCE_LIMIT points; keep it off the event loop.
+    locations = await run_in_threadpool(downsample_locations, locations, max_points=max_points, tolerance_m=tolerance)
 
     data = [
     AssetLocationResponse(
@@ -0,0 +1,41 @@
+import json
+from app.services.backplane import pack_notifications
+
+
+def _message(i: int, extra: int = 0) -> dict:
+    return {"asset_id": i, "longitude": 1.5, "latitude": 2.5, "additional_data": {"pad": "x" * extra}}
+
+
+def test_batches_stay_under_the_limit_and_keep_order():
+    messages = [_message(i) for i in range(200)]
+    limit = 1000
+
+    payloads = pack_notifications(messages, limit=limit)
+
+    assert len(payloads) > 1
+    assert all(len(p.encode()) <= limit for p in payloads)
+    assert [m for p in payloads for m in json.loads(p)] == messages
+
+
+def test_batch_fills_up_to_exactly_the_limit():
+    message = _message(1)
+    encoded = len(json.dumps(message, separators=(",", ":")).encode())
+    # "[" + n messages joined by "," + "]" is exactly n * (encoded + 1) + 1.
+    limit = 3 * (encoded + 1) + 1
+
+    payloads = pack_notifications([message] * 4, limit=limit)
+
+    assert [len(json.loads(p)) for p in payloads] == [3, 1]
+    assert len(payloads[0].encode()) == limit
+
+
+def test_oversized_message_drops_additional_data():
+    messages = [_message(1), _message(2, extra=5000), _message(3)]
+
+    payloads = pack_notifications(messages, limit=1000)
+
+    decoded = [m for p in payloads for m in json.loads(p)]
+    assert [m["asset_id"] for m in decoded] == [1, 2, 3]
+    assert decoded[1]["additional_data"] is None
+    assert decoded[0]["additional_data"] == {"pad": ""}
+    assert all(len(p.encode()) <= 1000 for p in payloads)
@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime, timezone
+from app.crud import geo_crud
+from app.schemas.geo_schemas import ZoneFeatureCollection
+
+SQUARE = [[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0], [0.0, 0.0]]]
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+    def __init__(self):
+        self.committed = False
+
+    async def execute(self, stmt, params):
+        created_at = datetime.now(timezone.utc)
+        return FakeResult([
+            {"id": i + 1, "asset_id": row["asset_id"], "name": row["name"], "created_at": created_at}
+            for i, row in enumerate(params)
+        ])
+
+    async def commit(self):
+        self.committed = True
+
+
+async def _no_invalid(db, geometries):
+    return []
+
+
+async def _no_transitions(db, **kwargs):
+    return []
+
+
+async def _apply(db, transitions):
+    return None
+
+
+def test_import_feature_with_null_properties(monkeypatch):
+    monkeypatch.setattr(geo_crud, "find_invalid_polygons", _no_invalid)
+    monkeypatch.setattr(geo_crud, "evaluate_geofence_transitions", _no_transitions)
+    monkeypatch.setattr(geo_crud, "apply_geofence_transitions", _apply)
+    collection = ZoneFeatureCollection.model_validate({
+        "type": "FeatureCollection",
+        "features": [{"type": "Feature", "geometry": {"type": "Polygon", "coordinates": SQUARE}, "properties": None}],
+    })
+    db = FakeSession()
+
+    zones = asyncio.run(geo_crud.import_geo_zones(db, collection, default_asset_id=7))
+
+    assert db.committed
+    assert len(zones) == 1
+    assert zones[0].asset_id == 7
+    assert zones[0].name is None
+    assert zones[0].coordinates == SQUARE[0]
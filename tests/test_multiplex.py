@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+from app.services.multiplex import bbox_contains, compact
+
+
+def test_compact_rounds_and_uses_epoch_milliseconds():
+    message = {
+        "asset_id": 7,
+        "longitude": 13.123456789,
+        "latitude": -45.987654321,
+        "timestamp": datetime(2026, 3, 1, 0, 0, 1, 500000, tzinfo=timezone.utc),
+        "additional_data": {"ignored": True},
+    }
+    row = compact(message)
+    assert row == [7, 13.123457, -45.987654, 1772323201500]
+    assert compact({**message, "timestamp": "2026-03-01T00:00:01.500000+00:00"}) == row
+
+
+def test_bbox_contains():
+    bbox = (10.0, 40.0, 20.0, 50.0)
+    assert bbox_contains(bbox, 15.0, 45.0)
+    assert bbox_contains(bbox, 10.0, 50.0)
+    assert not bbox_contains(bbox, 25.0, 45.0)
+    assert not bbox_contains(bbox, 15.0, 55.0)
+
+
+def test_bbox_across_the_antimeridian():
+    bbox = (170.0, -10.0, -170.0, 10.0)
+    assert bbox_contains(bbox, 175.0, 0.0)
+    assert bbox_contains(bbox, -175.0, 0.0)
+    assert not bbox_contains(bbox, 0.0, 0.0)
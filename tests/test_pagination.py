@@ -0,0 +1,38 @@
+import base64
+import json
+from datetime import datetime, timezone
+import pytest
+from fastapi import HTTPException
+from app.crud.pagination import decode_cursor, encode_cursor
+
+
+def _raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    ts = datetime(2026, 3, 1, 12, 30, 15, 250000, tzinfo=timezone.utc)
+    cursor = encode_cursor({"ts": ts, "id": 42})
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "ts", "id") == {"ts": ts, "id": 42}
+
+
+def test_missing_cursor_is_first_page():
+    assert decode_cursor(None, "id") is None
+    assert decode_cursor("", "id") is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-base64!",
+    _raw_cursor([1, 2]),
+    _raw_cursor({"ts": "2026-03-01T00:00:00+00:00"}),
+    _raw_cursor({"ts": "yesterday", "id": 1}),
+    _raw_cursor({"ts": "2026-03-01T00:00:00+00:00", "id": "1; DROP TABLE assets"}),
+    _raw_cursor({"ts": "2026-03-01T00:00:00+00:00", "id": 1.5}),
+    _raw_cursor({"ts": 1700000000, "id": 1}),
+])
+def test_bad_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, "ts", "id")
+    assert error.value.status_code == 400
@@ -0,0 +1,15 @@
+from app.services.profiler import normalize_statement
+
+
+def test_literals_and_parameters_share_a_shape():
+    assert normalize_statement("SELECT * FROM assets WHERE id = 1 AND name = 'van'") == \
+        normalize_statement("SELECT * FROM assets WHERE id = %(id_1)s AND name = $2")
+
+
+def test_in_lists_and_multi_row_values_collapse():
+    assert normalize_statement("SELECT 1 FROM t WHERE id IN (1, 2, 3)") == "SELECT ? FROM t WHERE id IN (?)"
+    assert normalize_statement("INSERT INTO t (a) VALUES (:a_0), (:a_1),\n (:a_2)") == "INSERT INTO t (a) VALUES (?)"
+
+
+def test_identifiers_with_digits_and_casts_are_kept():
+    assert normalize_statement("SELECT col1 FROM t2 WHERE x = '{}'::jsonb") == "SELECT col1 FROM t2 WHERE x = ?::jsonb"
@@ -0,0 +1,91 @@
+import math
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.crud.rollups_crud import EARTH_RADIUS_M, compute_rollups
+from app.schemas.locations_schema import LocationResponse
+
+START = datetime(2026, 3, 1, 10, 59, 0, tzinfo=timezone.utc)
+
+
+def _east(meters: float) -> float:
+    # Longitude offset along the equator, where haversine is exact.
+    return math.degrees(meters / EARTH_RADIUS_M)
+
+
+def _point(id: int, seconds: float, meters: float, asset_id: int = 1) -> LocationResponse:
+    return LocationResponse(
+        id=id, asset_id=asset_id, latitude=0.0, longitude=_east(meters),
+        timestamp=START + timedelta(seconds=seconds),
+    )
+
+
+def _by_bucket(rows, granularity):
+    return {row["bucket_start"]: row for row in rows if row["granularity"] == granularity}
+
+
+def test_buckets_and_moving_vs_idle_time():
+    points = [
+        _point(1, 0, 0),
+        _point(2, 30, 300),          # 10 m/s: moving, ends in the 10:00 bucket
+        _point(3, 90, 300),          # parked for 60 s: idle, 11:00 bucket
+        _point(4, 120, 310),         # 10 m in 30 s, below the moving speed: idle
+        _point(5, 9000, 5310),       # after a 2.5 h gap: distance but no time
+    ]
+
+    hours = _by_bucket(compute_rollups(points, {}), "hour")
+
+    assert sorted(hours) == [
+        datetime(2026, 3, 1, 10, tzinfo=timezone.utc),
+        datetime(2026, 3, 1, 11, tzinfo=timezone.utc),
+        datetime(2026, 3, 1, 13, tzinfo=timezone.utc),
+    ]
+    ten, eleven, one = (hours[key] for key in sorted(hours))
+
+    assert ten["point_count"] == 2
+    assert ten["distance_m"] == pytest.approx(300)
+    assert ten["moving_distance_m"] == pytest.approx(300)
+    assert ten["moving_seconds"] == pytest.approx(30)
+    assert ten["idle_seconds"] == 0
+    assert ten["max_speed_mps"] == pytest.approx(10)
+    assert ten["first_timestamp"] == START
+    assert ten["last_timestamp"] == START + timedelta(seconds=30)
+
+    assert eleven["point_count"] == 2
+    assert eleven["distance_m"] == pytest.approx(10)
+    assert eleven["moving_distance_m"] == 0
+    assert eleven["moving_seconds"] == 0
+    assert eleven["idle_seconds"] == pytest.approx(90)
+
+    assert one["point_count"] == 1
+    assert one["distance_m"] == pytest.approx(5000)
+    assert one["moving_distance_m"] == 0
+    assert one["moving_seconds"] == one["idle_seconds"] == one["max_speed_mps"] == 0
+
+
+def test_day_bucket_sums_the_hours():
+    points = [_point(1, 0, 0), _point(2, 30, 300), _point(3, 90, 300), _point(4, 120, 310)]
+
+    days = _by_bucket(compute_rollups(points, {}), "day")
+
+    (day,) = days.values()
+    assert day["bucket_start"] == datetime(2026, 3, 1, tzinfo=timezone.utc)
+    assert day["point_count"] == 4
+    assert day["distance_m"] == pytest.approx(310)
+    assert day["moving_distance_m"] == pytest.approx(300)
+    assert day["moving_seconds"] == pytest.approx(30)
+    assert day["idle_seconds"] == pytest.approx(90)
+
+
+def test_segments_chain_from_previous_position_and_skip_late_points():
+    previous = {1: (0.0, 0.0, START)}
+    points = [
+        _point(1, 20, 200),          # chained from the previous position
+        _point(2, -60, 5000),        # older than the previous position
+    ]
+
+    (row,) = _by_bucket(compute_rollups(points, previous), "day").values()
+
+    assert row["point_count"] == 2
+    assert row["distance_m"] == pytest.approx(200)
+    assert row["moving_seconds"] == pytest.approx(20)
+    assert row["max_longitude"] == pytest.approx(_east(5000))
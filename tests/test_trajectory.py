@@ -0,0 +1,31 @@
+import numpy as np
+from app.services.trajectory import stop_boundaries
+
+
+def _drive(start, heading, speed_mps, seconds):
+    steps = np.arange(1, seconds + 1)[:, None] * speed_mps
+    return start + steps * np.array([np.cos(heading), np.sin(heading)])
+
+
+def test_slow_drive_is_not_a_stop():
+    # 29 km/h at 1 Hz: every step is ~8 m, well under the stop radius.
+    xy = _drive(np.zeros(2), 0.3, 8.0, 3000)
+    seconds = np.arange(len(xy), dtype=float)
+    assert not stop_boundaries(xy, seconds, radius_m=15.0, min_duration_s=120.0).any()
+
+
+def test_jittery_stop_is_one_stop():
+    rng = np.random.default_rng(7)
+    before = _drive(np.zeros(2), 0.0, 10.0, 300)
+    parked_at = before[-1] + np.array([10.0, 0.0])
+    # Consecutive fixes jump up to ~12 m, but all stay within 6 m of the spot.
+    parked = parked_at + np.clip(rng.normal(0, 3.0, size=(600, 2)), -4.0, 4.0)
+    after = _drive(parked_at, 1.0, 10.0, 300)
+    xy = np.vstack([before, parked, after])
+    seconds = np.arange(len(xy), dtype=float)
+
+    marked = np.flatnonzero(stop_boundaries(xy, seconds, radius_m=15.0, min_duration_s=120.0))
+
+    assert len(marked) == 2
+    assert abs(marked[0] - 300) <= 2
+    assert abs(marked[1] - 899) <= 2